@@ -0,0 +1 @@
+"""Benchmarks reprodutíveis do caminho de dados (ver run.py)."""
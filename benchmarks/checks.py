@@ -0,0 +1,78 @@
+"""
+Verificações de regressão do caminho de dados, em um SQLite temporário.
+
+Cada verificação retorna a lista de problemas encontrados; o comando sai
+com código 1 se alguma falhar.
+
+Uso:
+    python -m benchmarks.checks
+"""
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+
+
+def check_empty_cache_then_insert() -> List[str]:
+    """
+    Instalação nova: o cache carrega um resultado vazio (e o grava no snapshot),
+    a primeira transação é salva e a leitura seguinte anexa o delta.
+    """
+    from src import crud, database, migrations, models
+    from src.cache import TransactionCache
+
+    migrations.ensure_schema()
+    problems: List[str] = []
+    with database.session_scope() as db:
+        cache = TransactionCache()
+        if not cache.get(db).empty:
+            problems.append("cache de um banco vazio não está vazio")
+
+        category = crud.create_category(db, "Mercado")
+        crud.create_transaction(db, models.TransactionCreate(
+            amount=-12.5, description="PRIMEIRA", category_id=category.id, date=datetime.now(),
+        ))
+        df = cache.get(db)
+        if len(df) != 1 or list(df['category_name'].astype(str)) != ["Mercado"]:
+            problems.append(f"delta após o cache vazio: {df.to_dict('records')}")
+
+        # Processo reiniciado: parte do snapshot (gravado vazio) e busca o delta
+        restarted = TransactionCache()
+        if len(restarted.get(db)) != 1:
+            problems.append("cache reiniciado a partir do snapshot não encontrou a transação")
+    return problems
+
+
+CHECKS: Dict[str, Callable[[], List[str]]] = {
+    "empty_cache_then_insert": check_empty_cache_then_insert,
+}
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    workdir = tempfile.mkdtemp(prefix="financas_checks_")
+    # As configurações de src são lidas na importação: definir antes de importar src
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'checks.db')}"
+    os.environ["TRANSACTIONS_SNAPSHOT_PATH"] = os.path.join(workdir, "snapshot.arrow")
+
+    failures = 0
+    try:
+        for name, check in CHECKS.items():
+            try:
+                problems = check()
+            except Exception as e:
+                problems = [f"{type(e).__name__}: {e}"]
+            print(f"[{'OK' if not problems else 'FALHA'}] {name}")
+            for problem in problems:
+                print(f"    {problem}")
+            failures += bool(problems)
+    finally:
+        from src import database
+        database.get_engine().dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,135 @@
+"""
+Paridade entre os backends das análises: SQL (analyzer_sql.summarize) e
+pandas (analyzer.summarize_totals sobre a tabela agregada e analyzer.analyze
+sobre as transações).
+
+Importa dados sintéticos com semente fixa em um SQLite temporário, mais casos
+de borda (valores zero, mês só com receitas, transações no mês de referência),
+e compara saldo mensal, médias por categoria, totais do mês atual e pizza
+para alguns meses de referência. Sai com código 1 se algum resultado diferir.
+
+Uso:
+    python -m benchmarks.parity
+    python -m benchmarks.parity --rows 20000 --seed 7
+"""
+import argparse
+import os
+import shutil
+import sys
+import tempfile
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import pandas as pd
+
+# Diferença máxima aceita entre somas em ponto flutuante (banco x pandas)
+TOLERANCE = 1e-6
+
+
+def edge_case_rows(reference_date: datetime) -> pd.DataFrame:
+    """Linhas de borda no formato do CSV de importação."""
+    this_month = reference_date.replace(day=2).strftime("%Y-%m-%d")
+    return pd.DataFrame([
+        # Valores zero (não contam como receita nem despesa)
+        (this_month, "ESTORNO ZERADO", "Alimentação", 0.0, "Expense"),
+        ("2015-03-10", "AJUSTE ZERADO", "Contas", 0.0, "Income"),
+        # Mês só com receitas (sem nenhuma despesa)
+        ("2015-01-05", "SALARIO ANTIGO", "Salário", 3000.0, "Income"),
+        ("2015-01-20", "FREELA ANTIGO", "Freelance", 800.0, "Income"),
+        # Gastos no mês de referência (totais do mês atual e alertas)
+        (this_month, "MERCADO MES", "Alimentação", 950.0, "Expense"),
+        (this_month, "UBER MES", "Transporte", 12.5, "Expense"),
+        (this_month, "SALARIO MES", "Salário", 4500.0, "Income"),
+    ], columns=["Date", "Transaction Description", "Category", "Amount", "Type"])
+
+
+def _frame_diff(label: str, expected: pd.DataFrame, actual: pd.DataFrame, keys: List[str]) -> List[str]:
+    expected = expected.sort_values(keys, ignore_index=True)
+    actual = actual[list(expected.columns)].sort_values(keys, ignore_index=True)
+    for frame in (expected, actual):
+        for key in keys:
+            frame[key] = frame[key].astype(str)
+    try:
+        pd.testing.assert_frame_equal(expected, actual, check_dtype=False, check_categorical=False, atol=TOLERANCE)
+    except AssertionError as e:
+        return [f"{label}: {e}"]
+    return []
+
+
+def _dict_diff(label: str, expected: Dict[str, float], actual: Dict[str, float]) -> List[str]:
+    expected = {str(k): float(v) for k, v in expected.items()}
+    actual = {str(k): float(v) for k, v in actual.items()}
+    if expected.keys() != actual.keys():
+        return [f"{label}: categorias diferentes {sorted(expected)} x {sorted(actual)}"]
+    return [
+        f"{label}[{key}]: {expected[key]} x {actual[key]}"
+        for key in expected if abs(expected[key] - actual[key]) > TOLERANCE
+    ]
+
+
+def compare_summaries(label: str, expected: Dict[str, Any], actual: Dict[str, Any]) -> List[str]:
+    """Diferenças entre dois resumos no formato de analyzer.summarize_totals."""
+    return (
+        _frame_diff(f"{label}/balance", expected['balance'], actual['balance'], ['Year', 'Month'])
+        + _dict_diff(f"{label}/category_averages", expected['category_averages'], actual['category_averages'])
+        + _dict_diff(f"{label}/current_totals", expected['current_totals'], actual['current_totals'])
+        + _frame_diff(f"{label}/pie", expected['pie'], actual['pie'], ['category_name'])
+    )
+
+
+def check_parity(rows: int, seed: int, months_to_compare: int = 3) -> List[str]:
+    """Importa os dados de teste e compara os backends; retorna as diferenças encontradas."""
+    from benchmarks import synthetic
+    from src import analyzer, analyzer_sql, crud, database, migrations
+
+    today = datetime.now()
+    migrations.ensure_schema()
+    problems: List[str] = []
+    with database.session_scope() as db:
+        crud.bulk_import_transactions(
+            db, pd.concat([synthetic.generate_transactions(rows, seed=seed), edge_case_rows(today)], ignore_index=True)
+        )
+        totals = crud.get_monthly_totals_dataframe(db)
+        transactions = crud.get_transactions_dataframe(db)
+
+        # Mês atual, um mês no meio do histórico e o mês só com receitas
+        for reference_date in (today, datetime(today.year - 2, 6, 15), datetime(2015, 1, 31)):
+            sql = analyzer_sql.summarize(db, months_to_compare, reference_date)
+            month = reference_date.strftime("%Y-%m")
+            problems += compare_summaries(
+                f"{month}/totais", sql, analyzer.summarize_totals(totals, months_to_compare, reference_date)
+            )
+            problems += compare_summaries(
+                f"{month}/analyze", sql, analyzer.analyze(transactions, months_to_compare, reference_date)
+            )
+    return problems
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(prog="python -m benchmarks.parity", description="Paridade SQL x pandas das análises")
+    parser.add_argument("--rows", type=int, default=5000, help="Transações sintéticas")
+    parser.add_argument("--seed", type=int, default=42, help="Semente dos dados sintéticos")
+    args = parser.parse_args(argv)
+
+    workdir = tempfile.mkdtemp(prefix="financas_parity_")
+    # As configurações de src são lidas na importação: definir antes de importar src
+    os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(workdir, 'parity.db')}"
+    os.environ["TRANSACTIONS_SNAPSHOT_PATH"] = ""
+    try:
+        problems = check_parity(args.rows, args.seed)
+    finally:
+        from src import database
+        database.get_engine().dispose()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    for problem in problems:
+        print(problem)
+    if problems:
+        print(f"{len(problems)} diferença(s) entre os backends.")
+        return 1
+    print("Backends SQL e pandas com resultados idênticos.")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
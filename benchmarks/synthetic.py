@@ -0,0 +1,98 @@
+"""
+Gerador de transações sintéticas no formato do CSV de importação.
+
+As categorias seguem uma distribuição de Zipf (poucas categorias concentram
+a maior parte das transações, como em extratos reais), os valores seguem uma
+log-normal por categoria e as descrições repetem um conjunto limitado de
+estabelecimentos por categoria. Com a mesma semente, o resultado é idêntico.
+"""
+import os
+from datetime import datetime
+from typing import Iterator, Optional
+
+import numpy as np
+import pandas as pd
+
+# (categoria, tipo, valor mediano) — as primeiras são as mais frequentes
+CATEGORIES = [
+    ("Alimentação", "Expense", 45.0),
+    ("Transporte", "Expense", 25.0),
+    ("Restaurantes", "Expense", 70.0),
+    ("Compras", "Expense", 120.0),
+    ("Contas", "Expense", 180.0),
+    ("Lazer", "Expense", 90.0),
+    ("Saúde", "Expense", 150.0),
+    ("Salário", "Income", 4500.0),
+    ("Aluguel", "Expense", 1800.0),
+    ("Educação", "Expense", 400.0),
+    ("Viagem", "Expense", 900.0),
+    ("Freelance", "Income", 1200.0),
+    ("Presentes", "Expense", 110.0),
+    ("Investimentos", "Income", 300.0),
+    ("Impostos", "Expense", 650.0),
+]
+
+# Expoente da distribuição de Zipf das categorias e estabelecimentos por categoria
+CATEGORY_SKEW = 1.1
+MERCHANTS_PER_CATEGORY = 25
+
+# Linhas geradas por vez ao gravar CSVs grandes (limita a memória)
+WRITE_CHUNK_ROWS = 1_000_000
+
+
+def _zipf_weights(n: int, skew: float) -> np.ndarray:
+    weights = 1.0 / np.arange(1, n + 1) ** skew
+    return weights / weights.sum()
+
+
+def generate_transactions(
+    rows: int,
+    seed: int = 42,
+    years: int = 5,
+    end: Optional[datetime] = None
+) -> pd.DataFrame:
+    """
+    Gera `rows` transações nas colunas de crud.IMPORT_REQUIRED_COLUMNS.
+
+    Args:
+        rows: Número de linhas.
+        seed: Semente do gerador (mesma semente, mesmos dados).
+        years: Anos de histórico, terminando em `end`.
+        end: Data final (padrão: 1º dia do mês atual, para os meses completos
+            da janela de análise terem dados).
+    """
+    rng = np.random.default_rng(seed)
+    end = pd.Timestamp(end or datetime.now().replace(day=1)).normalize()
+    start = end - pd.DateOffset(years=years)
+
+    names = np.array([c[0] for c in CATEGORIES])
+    types = np.array([c[1] for c in CATEGORIES])
+    medians = np.array([c[2] for c in CATEGORIES])
+
+    category = rng.choice(len(CATEGORIES), size=rows, p=_zipf_weights(len(CATEGORIES), CATEGORY_SKEW))
+    merchant = rng.choice(MERCHANTS_PER_CATEGORY, size=rows, p=_zipf_weights(MERCHANTS_PER_CATEGORY, 1.0))
+    amount = np.round(rng.lognormal(np.log(medians[category]), 0.6), 2)
+    offsets = rng.integers(0, (end - start).days, size=rows)
+    dates = start + pd.to_timedelta(offsets, unit="D")
+
+    return pd.DataFrame({
+        "Date": dates.strftime("%Y-%m-%d"),
+        "Transaction Description": pd.Series(names[category]).str.upper() + " LOJA " + pd.Series(merchant).astype(str),
+        "Category": names[category],
+        "Amount": amount,
+        "Type": types[category],
+    })
+
+
+def iter_chunks(rows: int, seed: int = 42, chunk_rows: int = WRITE_CHUNK_ROWS, **kwargs) -> Iterator[pd.DataFrame]:
+    """Gera as transações em blocos (semente derivada por bloco, resultado reprodutível)."""
+    for index, start in enumerate(range(0, rows, chunk_rows)):
+        yield generate_transactions(min(chunk_rows, rows - start), seed=seed + index, **kwargs)
+
+
+def write_csv(path: str, rows: int, seed: int = 42, **kwargs) -> str:
+    """Grava um CSV sintético de `rows` linhas em blocos e retorna o caminho."""
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    for index, chunk in enumerate(iter_chunks(rows, seed, **kwargs)):
+        chunk.to_csv(path, mode="w" if index == 0 else "a", header=index == 0, index=False)
+    return path
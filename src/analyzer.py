@@ -1,122 +1,366 @@
+import os
 import pandas as pd
-from typing import Dict, Any, List
+from typing import Dict, Any, Iterable, List, Optional, Tuple
 from datetime import datetime
 
+from src import anomalies
+from src.instrumentation import traced
+from src.memo import AnalysisMemo
+
+# Backend padrão das agregações do dashboard:
+# 'pandas' (tabela agregada em memória) ou 'sql' (GROUP BY no banco, ver analyzer_sql.py)
+ANALYZER_BACKENDS = ('pandas', 'sql')
+ANALYZER_BACKEND = os.getenv("ANALYZER_BACKEND", "pandas").strip().lower()
+
+# Resultados guardados por (função, versão dos dados, parâmetros); ver memo.py
+ANALYSIS_CACHE_SIZE = int(os.getenv("ANALYSIS_CACHE_SIZE", "64"))
+analysis_memo = AnalysisMemo(maxsize=ANALYSIS_CACHE_SIZE)
+
+
+def _memo_key(name: str, value: Any) -> Any:
+    """As análises só dependem do mês de referência, não do instante exato."""
+    if name == 'reference_date':
+        return month_start(value or datetime.now())
+    return value
+
+
+memoized = analysis_memo.memoize(normalize=_memo_key)
+
+
+@memoized
+@traced
 def calculate_monthly_balance(df: pd.DataFrame) -> pd.DataFrame:
     """
     Calcula o saldo (Entradas e Saídas) agrupado por Mês/Ano.
+    Não altera o DataFrame recebido.
     
     Args:
-        df: DataFrame de transações com colunas 'date' e 'amount'.
+        df: DataFrame de transações com colunas 'date' e 'amount' (ou 'amount_cents').
         
     Returns:
         DataFrame com colunas 'Year', 'Month', 'Income' (Entradas), 
         'Expense' (Saídas) e 'Balance' (Saldo).
     """
-    # 1. Cria colunas de tempo
-    df['Year'] = df['date'].dt.year
-    df['Month'] = df['date'].dt.month
-    
-    # 2. Divide em Entradas (amount > 0) e Saídas (amount < 0)
-    income_df = df[df['amount'] > 0]
-    expense_df = df[df['amount'] < 0]
-    
-    # 3. Agrupa as Entradas por mês/ano
-    monthly_income = income_df.groupby(['Year', 'Month'])['amount'].sum().reset_index()
-    monthly_income.rename(columns={'amount': 'Income'}, inplace=True)
-    
-    # 4. Agrupa as Saídas (usamos o valor absoluto para facilitar a exibição)
-    monthly_expense = expense_df.groupby(['Year', 'Month'])['amount'].sum().reset_index()
-    monthly_expense['amount'] = monthly_expense['amount'].abs() # Valor positivo para Despesa
-    monthly_expense.rename(columns={'amount': 'Expense'}, inplace=True)
-    
-    # 5. Combina as tabelas
-    balance_df = pd.merge(monthly_income, monthly_expense, on=['Year', 'Month'], how='outer').fillna(0)
-    
-    # 6. Calcula o Saldo
-    balance_df['Balance'] = balance_df['Income'] - balance_df['Expense']
-    
-    return balance_df.sort_values(['Year', 'Month'])
+    return calculate_monthly_balance_from_totals(build_monthly_totals(df))
 
 
-def calculate_category_averages(df: pd.DataFrame, months_to_compare: int = 3) -> Dict[str, Any]:
+@memoized
+@traced
+def calculate_category_averages(
+    df: pd.DataFrame,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
     """
     Calcula a média de gastos por categoria nos últimos N meses para fins de alerta.
     
     Args:
-        df: DataFrame de transações.
+        df: DataFrame de transações (basta a janela de analysis_window).
         months_to_compare: Número de meses para calcular a média histórica.
+        reference_date: Data do "mês atual" (padrão: hoje).
         
     Returns:
         Um dicionário mapeando o nome da categoria para sua média de gasto mensal.
     """
+    # Mesma regra da versão agregada: os N meses completos anteriores ao mês de referência
+    return calculate_category_averages_from_totals(build_monthly_totals(df), months_to_compare, reference_date)
+
+@memoized
+@traced
+def generate_insights(
+    df: pd.DataFrame,
+    category_averages: Dict[str, float],
+    reference_date: Optional[datetime] = None
+) -> List[Dict[str, Any]]:
+    """
+    Gera insights e alertas para o mês de referência.
     
-    # 1. Foca apenas nas despesas (amount < 0) e usa o valor absoluto
-    expense_df = df[df['amount'] < 0].copy()
-    expense_df['amount'] = expense_df['amount'].abs()
+    Args:
+        df: DataFrame de transações (basta o mês de referência).
+        category_averages: Médias históricas calculadas.
+        reference_date: Data do "mês atual" (padrão: hoje).
+    """
+    # Total de gasto por categoria no mês de referência (máscara única, sem cópia do DataFrame)
+    reference_date = reference_date or datetime.now()
+    amount = amount_cents(df)
+    mask = (
+        (df['date'] >= month_start(reference_date))
+        & (df['date'] < month_start(reference_date, 1))
+        & (amount < 0)
+    )
+    current_totals = ((-amount[mask]).groupby(df.loc[mask, 'category_name'], observed=True).sum() / 100).to_dict()
     
-    # 2. Define o limite de tempo para a média (exclui o mês atual)
-    today = datetime.now()
-    # Define o início do mês anterior
-    end_date_avg = today.replace(day=1) - pd.Timedelta(days=1) 
+    return build_insights(current_totals, category_averages)
+
+
+def build_insights(current_totals: Dict[str, float], category_averages: Dict[str, float]) -> List[Dict[str, Any]]:
+    """
+    Compara o gasto do mês atual com a média histórica de cada categoria.
+    Visão de um único mês sobre o motor de anomalias (ver anomalies.py).
     
-    # Se não houver dados suficientes, ajusta a data de início
-    if not expense_df.empty:
-        start_date_avg = end_date_avg - pd.DateOffset(months=months_to_compare)
-        
-        # 3. Filtra os dados históricos para o cálculo da média
-        historical_df = expense_df[
-            (expense_df['date'] >= start_date_avg) & (expense_df['date'] <= end_date_avg)
-        ]
-        
-        # 4. Agrupa por mês/ano e categoria
-        monthly_category_expense = historical_df.groupby([
-            historical_df['date'].dt.to_period('M'), 'category_name'
-        ])['amount'].sum().reset_index()
-        
-        # 5. Calcula a média mensal de gasto por categoria no período
-        category_averages = monthly_category_expense.groupby('category_name')['amount'].mean().to_dict()
+    Args:
+        current_totals: Gasto (valor positivo) por categoria no mês atual.
+        category_averages: Médias históricas calculadas.
+    """
+    current = pd.DataFrame({
+        'category_name': list(current_totals.keys()),
+        'expense': list(current_totals.values()),
+    })
+    current['baseline'] = current['category_name'].map(category_averages)
+    return anomalies.format_insights(anomalies.classify(current))
+
+
+@traced
+def insights_history(totals: pd.DataFrame, **options: Any) -> pd.DataFrame:
+    """
+    Alertas e sucessos de todos os meses do histórico em uma única chamada.
+    
+    Args:
+        totals: Totais mensais (tabela agregada ou build_monthly_totals).
+        **options: Janela, linha de base e limites (ver anomalies.detect_anomalies).
         
-        return category_averages
+    Returns:
+        Só as linhas sinalizadas de anomalies.detect_anomalies, em ordem cronológica.
+    """
+    detected = anomalies.detect_anomalies(totals, **options)
+    return detected[detected['type'].notna()].reset_index(drop=True)
 
-    return {} # Retorna vazio se o DataFrame estiver vazio
 
-def generate_insights(df: pd.DataFrame, category_averages: Dict[str, float]) -> List[Dict[str, Any]]:
+# =======================================================
+# Análises sobre os totais mensais agregados
+# (tabela 'monthly_category_totals' ou build_monthly_totals)
+# =======================================================
+
+@traced
+def build_monthly_totals(df: pd.DataFrame, key: str = 'category_name') -> pd.DataFrame:
     """
-    Gera insights e alertas para o mês atual.
+    Agrega as transações em totais mensais por categoria, no mesmo formato
+    da tabela 'monthly_category_totals'. É o pivô (mês x categoria) do qual
+    saem todas as demais análises; não altera o DataFrame recebido.
     
     Args:
-        df: DataFrame de transações.
-        category_averages: Médias históricas calculadas.
+        df: DataFrame de transações com colunas 'date', 'amount' (ou 'amount_cents')
+            e a coluna `key`.
+        key: Coluna que identifica a categoria ('category_name' ou 'category_id').
+        
+    Returns:
+        DataFrame com colunas 'year', 'month', `key`, 'income', 'expense'
+        (valor positivo), 'income_count' e 'expense_count'.
+    """
+    return _finish_totals(_period_totals_cents(df, key))
+
+
+@traced
+def build_monthly_totals_from_chunks(chunks: Iterable[pd.DataFrame], key: str = 'category_name') -> pd.DataFrame:
+    """
+    Mesmo resultado de build_monthly_totals, lendo as transações em blocos
+    (ex.: crud.iter_transactions_dataframes).
+
+    Cada bloco é reduzido aos totais (mês x categoria) e somado a um
+    acumulador; só o acumulador e um bloco ficam em memória por vez, então o
+    pico de memória não depende do tamanho da tabela. As somas são feitas em
+    centavos inteiros, sem erro de arredondamento entre blocos.
     """
-    insights = []
+    accumulator: Optional[pd.DataFrame] = None
+    for chunk in chunks:
+        if chunk.empty:
+            continue
+        partial = _period_totals_cents(chunk, key)
+        partial[key] = partial[key].astype(object)  # Categorias diferentes em cada bloco
+        if accumulator is not None:
+            partial = pd.concat([accumulator, partial], ignore_index=True)
+        accumulator = partial.groupby(['period', key], sort=False).sum().reset_index()
+
+    if accumulator is None:  # Nenhuma transação
+        accumulator = pd.DataFrame({
+            'period': pd.Series(dtype='int64'),
+            key: pd.Series(dtype=object),
+            **{col: pd.Series(dtype='int64') for col in ('income', 'expense', 'income_count', 'expense_count')},
+        })
+    return _finish_totals(accumulator.sort_values(['period', key], ignore_index=True))
+
+
+def _period_totals_cents(df: pd.DataFrame, key: str) -> pd.DataFrame:
+    """Totais por (período, key) em centavos; 'period' é o número do mês (ver _month_number)."""
+    amount = amount_cents(df)
+    dates = df['date']
+    # Chave única de período (meses desde o ano 0): agrupar por um inteiro
+    # é mais barato que por (ano, mês)
+    period = _month_number(dates.dt.year, dates.dt.month).rename('period')
     
-    # Filtra os dados do mês atual
-    current_month_start = datetime.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
-    current_month_df = df[df['date'] >= current_month_start]
+    # Separação vetorizada de sinal: Entradas e Saídas (valor positivo, em centavos)
+    parts = pd.DataFrame({
+        'income': amount.clip(lower=0),
+        'expense': (-amount).clip(lower=0),
+        'income_count': (amount > 0).astype('int64'),
+        'expense_count': (amount < 0).astype('int64'),
+    })
+    return parts.groupby([period, df[key]], observed=True).sum().reset_index()
+
+
+def _finish_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """Converte os totais em centavos para o formato de 'monthly_category_totals'."""
+    totals = totals.copy()
+    totals['income'] = totals['income'] / 100
+    totals['expense'] = totals['expense'] / 100
     
-    # Total de gasto por categoria no mês atual
-    current_expenses = current_month_df[current_month_df['amount'] < 0]
-    current_expenses['amount'] = current_expenses['amount'].abs()
-    current_totals = current_expenses.groupby('category_name')['amount'].sum().to_dict()
+    totals.insert(0, 'year', totals['period'] // 12)
+    totals.insert(1, 'month', totals['period'] % 12 + 1)
+    return totals.drop(columns='period')
+
+
+def amount_cents(df: pd.DataFrame) -> pd.Series:
+    """
+    Valores das transações em centavos (int64).
+    Aceita o layout compacto ('amount_cents') ou o original ('amount' em float).
+    """
+    if 'amount_cents' in df:
+        return df['amount_cents']
+    return (df['amount'] * 100).round().astype('int64')
+
+
+def memory_report(df: pd.DataFrame) -> Dict[str, Any]:
+    """
+    Relatório de memória do DataFrame (inclui o conteúdo dos textos).
     
-    for category, current_total in current_totals.items():
-        historical_avg = category_averages.get(category)
-        
-        if historical_avg is not None and historical_avg > 0:
-            if current_total > historical_avg * 1.20: # Alerta se 20% acima da média
-                diff_percent = (current_total / historical_avg - 1) * 100
-                insights.append({
-                    "type": "ALERTA 🚨",
-                    "message": f"Seu gasto em **{category}** ({current_total:.2f}) está **{diff_percent:.0f}% ACIMA** da média histórica ({historical_avg:.2f}). Atenção!"
-                })
-            elif current_total < historical_avg * 0.80:
-                 diff_percent = (1 - current_total / historical_avg) * 100
-                 insights.append({
-                    "type": "SUCESSO 🎉",
-                    "message": f"Parabéns! Seu gasto em **{category}** ({current_total:.2f}) está **{diff_percent:.0f}% ABAIXO** da média histórica. Continue assim!"
-                })
-        
-    return insights
+    Returns:
+        Dicionário com 'rows', 'total_bytes', 'bytes_per_row' e
+        'columns' (bytes por coluna).
+    """
+    usage = df.memory_usage(deep=True, index=True)
+    total = int(usage.sum())
+    rows = len(df)
+    return {
+        'rows': rows,
+        'total_bytes': total,
+        'bytes_per_row': total / rows if rows else 0.0,
+        'columns': {col: int(usage[col]) for col in df.columns},
+    }
+
+
+def _month_number(year, month):
+    """Converte ano/mês em um número sequencial de meses (facilita janelas)."""
+    return year * 12 + month - 1
+
+
+def month_start(reference_date: datetime, offset: int = 0) -> datetime:
+    """Primeiro instante do mês de `reference_date`, deslocado em `offset` meses."""
+    year, month_index = divmod(_month_number(reference_date.year, reference_date.month) + offset, 12)
+    return datetime(year, month_index + 1, 1)
+
+
+def analysis_window(reference_date: Optional[datetime] = None, months_to_compare: int = 3) -> Tuple[datetime, datetime]:
+    """
+    Intervalo de datas [início, fim) que as análises do mês de referência precisam:
+    os N meses completos anteriores (médias) mais o próprio mês (insights).
+    """
+    reference_date = reference_date or datetime.now()
+    return month_start(reference_date, -months_to_compare), month_start(reference_date, 1)
+
+
+def calculate_monthly_balance_from_totals(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Versão de calculate_monthly_balance sobre os totais mensais agregados.
+    
+    Returns:
+        DataFrame com colunas 'Year', 'Month', 'Income', 'Expense' e 'Balance'.
+    """
+    active = totals[(totals['income_count'] + totals['expense_count']) > 0]
+    balance_df = active.groupby(['year', 'month'], as_index=False)[['income', 'expense']].sum()
+    balance_df = balance_df.rename(columns={
+        'year': 'Year', 'month': 'Month', 'income': 'Income', 'expense': 'Expense'
+    })
+    balance_df['Balance'] = balance_df['Income'] - balance_df['Expense']
+    
+    return balance_df.sort_values(['Year', 'Month']).reset_index(drop=True)
+
+
+def calculate_category_averages_from_totals(
+    totals: pd.DataFrame,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Média mensal de gasto por categoria nos N meses completos anteriores ao mês de referência.
+    Meses sem despesa na categoria não entram na média.
+    """
+    reference_date = reference_date or datetime.now()
+    current_month = _month_number(reference_date.year, reference_date.month)
+    months = _month_number(totals['year'], totals['month'])
+    
+    in_window = (
+        (months >= current_month - months_to_compare)
+        & (months < current_month)
+        & (totals['expense_count'] > 0)
+    )
+    return totals[in_window].groupby('category_name', observed=True)['expense'].mean().to_dict()
+
 
+def current_month_totals_from_totals(totals: pd.DataFrame, reference_date: Optional[datetime] = None) -> Dict[str, float]:
+    """Gasto (valor positivo) por categoria no mês de referência (padrão: mês atual)."""
+    reference_date = reference_date or datetime.now()
+    current = totals[
+        (totals['year'] == reference_date.year)
+        & (totals['month'] == reference_date.month)
+        & (totals['expense_count'] > 0)
+    ]
+    return current.groupby('category_name', observed=True)['expense'].sum().to_dict()
+
+
+@traced
+def summarize_totals(
+    totals: pd.DataFrame,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Resumo completo do dashboard a partir dos totais mensais.
+    
+    Returns:
+        Dicionário com 'balance' (saldo mensal), 'category_averages',
+        'current_totals' (gasto do mês atual por categoria) e 'pie'
+        (gasto total por categoria, colunas 'category_name' e 'expense').
+    """
+    return {
+        'balance': calculate_monthly_balance_from_totals(totals),
+        'category_averages': calculate_category_averages_from_totals(totals, months_to_compare, reference_date),
+        'current_totals': current_month_totals_from_totals(totals, reference_date),
+        'pie': totals[totals['expense_count'] > 0].groupby('category_name', as_index=False, observed=True)['expense'].sum(),
+    }
 
+
+@memoized
+@traced
+def analyze(
+    df: pd.DataFrame,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Ponto de entrada único da análise sobre o DataFrame de transações.
+    
+    Calcula o pivô mês x categoria uma única vez e deriva dele o saldo mensal,
+    as médias por categoria, os totais do mês atual e os dados do gráfico de
+    pizza. Não altera o DataFrame recebido.
+    
+    Returns:
+        Mesmo formato de summarize_totals.
+    """
+    return summarize_totals(build_monthly_totals(df), months_to_compare, reference_date)
+
+
+@traced
+def analyze_chunks(
+    chunks: Iterable[pd.DataFrame],
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Como analyze, mas consumindo as transações em blocos, com memória
+    limitada (ver build_monthly_totals_from_chunks). Indicado para históricos
+    grandes demais para um único DataFrame.
+    
+    Returns:
+        Mesmo formato de summarize_totals.
+    """
+    return summarize_totals(build_monthly_totals_from_chunks(chunks), months_to_compare, reference_date)
@@ -0,0 +1,130 @@
+"""
+Backend SQL das análises do 'analyzer.py'.
+
+As agregações rodam como GROUP BY no banco (SQLAlchemy Core), então só as
+linhas já agregadas trafegam pelo ODBC. As consultas usam apenas construções
+portáveis (EXTRACT, CASE, SUM, AVG) e funcionam em SQL Server, PostgreSQL e SQLite.
+Os DataFrames retornados têm o mesmo formato das versões em pandas.
+"""
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+import pandas as pd
+from sqlalchemy import Integer, case, cast, extract, func, select
+from sqlalchemy.orm import Session
+
+from src.analyzer import analysis_window, month_start
+from src.instrumentation import read_sql, traced
+from src.models import Category, Transaction
+
+# Expressões reutilizadas pelas consultas
+_year = cast(extract('year', Transaction.date), Integer)
+_month = cast(extract('month', Transaction.date), Integer)
+_amount = Transaction.amount
+
+
+def calculate_monthly_balance(db: Session) -> pd.DataFrame:
+    """
+    Saldo mensal calculado no banco.
+
+    Returns:
+        DataFrame com colunas 'Year', 'Month', 'Income', 'Expense' e 'Balance'.
+    """
+    stmt = (
+        select(
+            _year.label('Year'),
+            _month.label('Month'),
+            func.sum(case((_amount > 0, _amount), else_=0.0)).label('Income'),
+            func.sum(case((_amount < 0, -_amount), else_=0.0)).label('Expense'),
+        )
+        .where(_amount != 0)
+        .group_by(_year, _month)
+        .order_by(_year, _month)
+    )
+    balance_df = read_sql(stmt, db.bind)
+    balance_df['Balance'] = balance_df['Income'] - balance_df['Expense']
+
+    return balance_df
+
+
+def monthly_category_expense(months_to_compare: int = 3, reference_date: Optional[datetime] = None):
+    """
+    Consulta (subquery) do gasto por mês e categoria nos N meses completos
+    anteriores ao mês de referência (padrão: mês atual).
+    """
+    reference_date = reference_date or datetime.now()
+    start, _ = analysis_window(reference_date, months_to_compare)
+    end = month_start(reference_date)
+    return (
+        select(
+            _year.label('year'),
+            _month.label('month'),
+            Category.name.label('category_name'),
+            func.sum(-_amount).label('amount'),
+        )
+        .join(Category, Transaction.category_id == Category.id)
+        .where(_amount < 0, Transaction.date >= start, Transaction.date < end)
+        .group_by(_year, _month, Category.name)
+    )
+
+
+def get_monthly_category_expense(
+    db: Session,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> pd.DataFrame:
+    """Gasto por mês e categoria na janela de N meses (colunas 'year', 'month', 'category_name', 'amount')."""
+    return read_sql(monthly_category_expense(months_to_compare, reference_date), db.bind)
+
+
+def calculate_category_averages(
+    db: Session,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """Média mensal de gasto por categoria nos N meses anteriores, calculada no banco."""
+    monthly = monthly_category_expense(months_to_compare, reference_date).subquery()
+    stmt = select(
+        monthly.c.category_name,
+        func.avg(monthly.c.amount).label('amount'),
+    ).group_by(monthly.c.category_name)
+
+    return {name: float(avg) for name, avg in db.execute(stmt)}
+
+
+def current_month_category_totals(db: Session, reference_date: Optional[datetime] = None) -> Dict[str, float]:
+    """Gasto (valor positivo) por categoria no mês de referência (padrão: mês atual)."""
+    reference_date = reference_date or datetime.now()
+    stmt = (
+        select(Category.name, func.sum(-_amount))
+        .join(Category, Transaction.category_id == Category.id)
+        .where(
+            _amount < 0,
+            Transaction.date >= month_start(reference_date),
+            Transaction.date < month_start(reference_date, 1),
+        )
+        .group_by(Category.name)
+    )
+    return {name: float(total) for name, total in db.execute(stmt)}
+
+
+def category_expense_totals(db: Session) -> pd.DataFrame:
+    """Gasto total por categoria em todo o histórico (colunas 'category_name', 'expense')."""
+    stmt = (
+        select(Category.name.label('category_name'), func.sum(-_amount).label('expense'))
+        .join(Category, Transaction.category_id == Category.id)
+        .where(_amount < 0)
+        .group_by(Category.name)
+    )
+    return read_sql(stmt, db.bind)
+
+
+@traced
+def summarize(db: Session, months_to_compare: int = 3, reference_date: Optional[datetime] = None) -> Dict[str, Any]:
+    """Resumo do dashboard no mesmo formato de analyzer.summarize_totals."""
+    return {
+        'balance': calculate_monthly_balance(db),
+        'category_averages': calculate_category_averages(db, months_to_compare, reference_date),
+        'current_totals': current_month_category_totals(db, reference_date),
+        'pie': category_expense_totals(db),
+    }
@@ -0,0 +1,174 @@
+"""
+Motor vetorizado de anomalias de gasto (mês x categoria).
+
+Monta uma matriz (meses em sequência x categorias) com o gasto mensal e
+calcula, para todas as células de uma vez, as linhas de base dos meses
+anteriores: média e desvio padrão móveis e média móvel exponencial (EWMA),
+além da razão e do z-score do mês em relação à base. Um mesmo cálculo serve
+para o mês atual (alertas do dashboard) e para reconstruir os alertas de todo
+o histórico.
+
+O formato de 'analyzer.generate_insights' (lista de {'type', 'message'}) é
+uma visão sobre este motor (ver format_insights).
+"""
+import os
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from src.instrumentation import traced
+
+# Padrões dos alertas: mês comparado aos N meses anteriores, com limites de ±20%
+ANOMALY_WINDOW = int(os.getenv("ANOMALY_WINDOW", "3"))
+ALERT_RATIO = float(os.getenv("ANOMALY_ALERT_RATIO", "1.20"))
+SUCCESS_RATIO = float(os.getenv("ANOMALY_SUCCESS_RATIO", "0.80"))
+
+ALERT = "ALERTA 🚨"
+SUCCESS = "SUCESSO 🎉"
+
+
+def expense_matrix(totals: pd.DataFrame) -> pd.DataFrame:
+    """
+    Matriz de gasto mensal: índice 'period' (número do mês, sem lacunas entre
+    o primeiro e o último) x colunas de categoria.
+
+    Meses sem despesa na categoria ficam NaN, então não entram nas linhas de
+    base (mesma regra de analyzer.calculate_category_averages_from_totals).
+
+    Args:
+        totals: Totais mensais (ver analyzer.build_monthly_totals).
+    """
+    expenses = totals[totals['expense_count'] > 0]
+    period = (expenses['year'].astype('int64') * 12 + expenses['month'].astype('int64') - 1).rename('period')
+    matrix = expenses.pivot_table(
+        index=period, columns=expenses['category_name'].astype(str), values='expense',
+        aggfunc='sum', observed=True,
+    )
+    if matrix.empty:
+        return matrix
+    return matrix.reindex(pd.RangeIndex(matrix.index.min(), matrix.index.max() + 1, name='period'))
+
+
+def baselines(
+    matrix: pd.DataFrame,
+    window: int = ANOMALY_WINDOW,
+    ewm_span: Optional[int] = None
+) -> Dict[str, pd.DataFrame]:
+    """
+    Linhas de base de cada célula, calculadas só com os meses anteriores.
+
+    Args:
+        matrix: Matriz de expense_matrix.
+        window: Meses anteriores considerados na média e no desvio padrão.
+        ewm_span: Span da EWMA (padrão: igual a `window`).
+
+    Returns:
+        Dicionário com as matrizes 'mean', 'std', 'ewma' e 'zscore'.
+    """
+    previous = matrix.shift(1)
+    rolling = previous.rolling(window, min_periods=1)
+    mean = rolling.mean()
+    std = previous.rolling(window, min_periods=2).std()
+    ewma = previous.ewm(span=ewm_span or window, ignore_na=True).mean()
+    zscore = (matrix - mean) / std.replace(0, np.nan)
+    return {'mean': mean, 'std': std, 'ewma': ewma, 'zscore': zscore}
+
+
+def classify(
+    frame: pd.DataFrame,
+    alert_ratio: float = ALERT_RATIO,
+    success_ratio: float = SUCCESS_RATIO,
+    z_threshold: Optional[float] = None
+) -> pd.DataFrame:
+    """
+    Classifica cada linha comparando 'expense' com 'baseline'.
+
+    Alerta se o gasto passa de baseline x alert_ratio; sucesso se fica abaixo
+    de baseline x success_ratio. Com `z_threshold`, exige também |z-score| >=
+    z_threshold (coluna 'zscore'), ignorando variações dentro do ruído normal
+    da categoria.
+
+    Returns:
+        Cópia de `frame` com 'type' (ALERT, SUCCESS ou None) e 'diff_percent'.
+    """
+    expense, baseline = frame['expense'], frame['baseline']
+    valid = baseline.notna() & (baseline > 0)
+    is_alert = valid & (expense > baseline * alert_ratio)
+    is_success = valid & (expense < baseline * success_ratio)
+    if z_threshold is not None:
+        is_alert &= frame['zscore'] >= z_threshold
+        is_success &= frame['zscore'] <= -z_threshold
+
+    classified = frame.copy()
+    classified['type'] = np.select([is_alert, is_success], [ALERT, SUCCESS], default=None)
+    classified['diff_percent'] = np.select(
+        [is_alert, is_success],
+        [(expense / baseline - 1) * 100, (1 - expense / baseline) * 100],
+        default=np.nan,
+    )
+    return classified
+
+
+@traced
+def detect_anomalies(
+    totals: pd.DataFrame,
+    window: int = ANOMALY_WINDOW,
+    baseline: str = 'mean',
+    ewm_span: Optional[int] = None,
+    alert_ratio: float = ALERT_RATIO,
+    success_ratio: float = SUCCESS_RATIO,
+    z_threshold: Optional[float] = None
+) -> pd.DataFrame:
+    """
+    Avalia todos os meses e categorias de uma vez (histórico completo).
+
+    Args:
+        totals: Totais mensais (ver analyzer.build_monthly_totals).
+        window: Meses anteriores na linha de base.
+        baseline: 'mean' (média móvel) ou 'ewma' (média móvel exponencial).
+        ewm_span: Span da EWMA (padrão: `window`).
+        alert_ratio, success_ratio, z_threshold: Ver classify.
+
+    Returns:
+        Uma linha por (mês, categoria) com gasto: 'year', 'month',
+        'category_name', 'expense', 'baseline', 'mean', 'std', 'ewma',
+        'zscore', 'type' e 'diff_percent'.
+    """
+    if baseline not in ('mean', 'ewma'):
+        raise ValueError(f"Linha de base desconhecida: {baseline}. Use 'mean' ou 'ewma'.")
+
+    matrix = expense_matrix(totals)
+    if matrix.empty:
+        columns = ['year', 'month', 'category_name', 'expense', 'baseline', 'mean', 'std', 'ewma', 'zscore']
+        return classify(pd.DataFrame({col: pd.Series(dtype=float) for col in columns}))
+
+    # Matrizes -> formato longo (uma linha por célula), direto nos arrays do numpy
+    stats = baselines(matrix, window, ewm_span)
+    periods = np.repeat(matrix.index.to_numpy(), matrix.shape[1])
+    long = pd.DataFrame({
+        'year': periods // 12,
+        'month': periods % 12 + 1,
+        'category_name': np.tile(matrix.columns.to_numpy(), matrix.shape[0]),
+        'expense': matrix.to_numpy().ravel(),
+        **{name: values.to_numpy().ravel() for name, values in stats.items()},
+    })
+    long = long[long['expense'].notna()].reset_index(drop=True)  # Só células com gasto
+    long['baseline'] = long[baseline]
+
+    return classify(long, alert_ratio, success_ratio, z_threshold)
+
+
+def format_insights(classified: pd.DataFrame) -> List[Dict[str, Any]]:
+    """Mensagens no formato de analyzer.generate_insights, para as linhas classificadas."""
+    insights = []
+    flagged = classified[classified['type'].notna()]
+    for kind, category, expense, baseline, diff in zip(
+        flagged['type'], flagged['category_name'], flagged['expense'], flagged['baseline'], flagged['diff_percent']
+    ):
+        if kind == ALERT:
+            message = f"Seu gasto em **{category}** ({expense:.2f}) está **{diff:.0f}% ACIMA** da média histórica ({baseline:.2f}). Atenção!"
+        else:
+            message = f"Parabéns! Seu gasto em **{category}** ({expense:.2f}) está **{diff:.0f}% ABAIXO** da média histórica. Continue assim!"
+        insights.append({"type": kind, "message": message})
+    return insights
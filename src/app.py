@@ -1,23 +1,131 @@
+import time
+_SCRIPT_STARTED = time.perf_counter() # Início da inicialização a frio (antes das importações)
+
+import json
 import streamlit as st
 import pandas as pd
 from sqlalchemy.orm import Session
 from datetime import datetime
-import plotly.express as px
-from src import crud, database, analyzer, models 
+from typing import Any, Dict, Hashable, Tuple
+from src import crud, database, analyzer, anomalies, charts, importer, instrumentation, migrations, models
+from src.cache import TransactionCache
+
+# O plotly só é importado ao desenhar os gráficos; o esquema é verificado uma
+# vez por processo (ver migrations.ensure_schema), não a cada importação
+_IMPORTS_SECONDS = time.perf_counter() - _SCRIPT_STARTED
+
+# Meses completos usados na média histórica dos alertas (ANOMALY_WINDOW)
+MONTHS_TO_COMPARE = anomalies.ANOMALY_WINDOW
+
+# Linhas por página na tabela de transações (paginação no banco)
+RAW_PAGE_SIZE = 50
 
-# Garantindo que as tabelas existam no DB
-models.Base.metadata.create_all(bind=database.engine) 
+# --- CACHE INCREMENTAL DE LEITURA DE DADOS ---
+@st.cache_resource
+def get_transaction_cache() -> TransactionCache:
+    """Cache único por processo: cada rerun busca apenas as transações novas (delta)."""
+    return TransactionCache()
+
+def fetch_data_to_df(db_session: Session, start: datetime = None) -> Tuple[pd.DataFrame, Hashable]:
+    """
+    Retorna o DataFrame de transações a partir de `start`, atualizado (somente
+    leitura), e sua versão: as análises com a mesma versão vêm do memo.
+    """
+    return get_transaction_cache().get_versioned(db_session, start=start)
 
-# --- FUNÇÃO CACHEADA DE LEITURA DE DADOS ---
-@st.cache_data(ttl=600) # Cache os dados por 10 minutos (600s), a menos que seja invalidado
-def fetch_data_to_df(_db_session: Session) -> pd.DataFrame:
-    """Busca todas as transações e retorna um DataFrame. Esta função será cacheada."""
-    return crud.get_transactions_dataframe(_db_session)
+@st.cache_data(ttl=600)
+def fetch_dashboard_summary(_db_session: Session, backend: str) -> Dict[str, Any]:
+    """
+    Busca o resumo agregado (poucas linhas) que alimenta o dashboard, com os
+    payloads dos gráficos já prontos: ficam no mesmo cache, e são refeitos só
+    quando o resumo é recalculado (escrita ou fim do TTL).
+    """
+    summary = crud.get_dashboard_summary(_db_session, backend=backend)
+    return {
+        **summary,
+        'balance_line': charts.balance_line_payload(summary['balance']),
+        'pie_payload': charts.pie_payload(summary['pie']),
+    }
+
+@st.cache_resource
+def start_import_worker() -> bool:
+    """Uma vez por processo: retoma importações interrompidas (ex.: reinício do container)."""
+    with database.session_scope() as db:
+        importer.resume_interrupted_jobs(db)
+    return True
+
+@st.fragment(run_every=1)
+def show_import_progress(job_id: int):
+    """
+    Painel de progresso da importação em segundo plano. Como fragmento, só ele
+    é reexecutado a cada segundo; o resto da página continua respondendo.
+    """
+    with database.session_scope() as db:
+        job = importer.get_import_job(db, job_id)
+        progress = importer.job_progress(job) if job else None
+
+    if progress is None:
+        del st.session_state['import_job_id']
+        return
+
+    if progress['status'] == 'done':
+        del st.session_state['import_job_id']
+        imported = progress['rows_done'] - progress['rows_skipped']
+        st.success(f"Sucesso! {imported} transações importadas ({progress['rows_skipped']} já existentes ignoradas).")
+        fetch_dashboard_summary.clear()
+        st.rerun() # Atualiza o dashboard inteiro com os novos dados
+    elif progress['status'] == 'failed':
+        st.error(f"Importação interrompida em {progress['rows_done']} linhas. Erro: {progress['error']}")
+        if st.button("Retomar Importação"):
+            with database.session_scope() as db:
+                importer.resume_import_job(db, job_id)
+    else:
+        total = progress['total_rows'] or '?'
+        st.progress(
+            progress['fraction'],
+            text=f"Importando... {progress['rows_done']}/{total} linhas ({progress['rows_per_sec']:.0f} linhas/s)"
+        )
 
 # Esta função apenas retorna a fábrica de sessões
 @st.cache_resource
 def get_db_session_factory():
-    return database.SessionLocal
+    return database.get_session_factory()
+
+def show_diagnostics(report: instrumentation.Report):
+    """Painel de diagnóstico (INSTRUMENTATION_ENABLED=1): onde o tempo do rerun foi gasto."""
+    with st.sidebar.expander("🩺 Diagnóstico"):
+        queries = report.queries
+        st.caption(
+            f"Rerun: {report.elapsed * 1000:.0f} ms · SQL: {queries['count']} consultas, "
+            f"{queries['seconds'] * 1000:.0f} ms, {queries['rows_fetched']} linhas lidas, "
+            f"{queries['rows_affected']} linhas gravadas"
+        )
+        if report.spans:
+            spans = pd.DataFrame.from_dict(report.spans, orient='index').sort_values('seconds', ascending=False)
+            spans['ms'] = (spans['seconds'] * 1000).round(1)
+            st.dataframe(spans[['count', 'ms', 'rows']], use_container_width=True)
+        if queries['slowest']:
+            st.caption(f"Consulta mais lenta ({queries['slowest_seconds'] * 1000:.0f} ms):")
+            st.code(queries['slowest'], language='sql')
+
+        transaction_cache = get_transaction_cache()
+        st.caption("Caches")
+        st.json({
+            'memo_analises': analyzer.analysis_memo.stats(),
+            'pool_conexoes': database.pool_status(),
+            'inicializacao': instrumentation.startup_metrics(),
+            'cache_transacoes': {
+                'cargas_completas': transaction_cache.full_loads,
+                'cargas_delta': transaction_cache.delta_loads,
+                'cargas_snapshot': transaction_cache.snapshot_loads,
+            },
+        })
+        st.download_button(
+            "Exportar métricas do processo (JSON)",
+            data=json.dumps(instrumentation.metrics_snapshot(), ensure_ascii=False, indent=2),
+            file_name="financas_metricas.json",
+            mime="application/json",
+        )
 
 def main_app():
     st.set_page_config(
@@ -25,9 +133,22 @@ def main_app():
         page_icon="💸",                 # Ícone na aba 
         layout="wide"                   
     )
-    
-    # --- OBTÉM UMA NOVA SESSÃO DO BANCO A CADA RERUN ---
-    db: Session = database.get_db()
+
+    # Tempo de importação e até a primeira página: uma linha no log por processo
+    instrumentation.startup_begin(_SCRIPT_STARTED, _IMPORTS_SECONDS)
+
+    # Com a instrumentação desativada, collect não mede nada e o painel não aparece.
+    # Uma sessão por rerun: fechada (conexão devolvida ao pool) ao fim do script.
+    with instrumentation.collect("rerun") as report, database.session_scope() as db:
+        render_app(db)
+    instrumentation.startup_first_paint()
+    if instrumentation.ENABLED:
+        show_diagnostics(report)
+
+def render_app(db: Session):
+    if migrations.SCHEMA_BOOTSTRAP:
+        migrations.ensure_schema()
+    start_import_worker()
 
 
     # --- BARRA LATERAL (MUDANÇA: TODA A LÓGICA AGORA ESTÁ AQUI DENTRO) ---
@@ -42,64 +163,35 @@ def main_app():
     # 1. IMPORTADOR DE CSV 
     # ==========================================
     st.sidebar.header("📂 Importar Dados (CSV)")
-    uploaded_file = st.sidebar.file_uploader("Selecione seu arquivo CSV", type=["csv"])
+    uploaded_files = st.sidebar.file_uploader("Selecione seus arquivos CSV", type=["csv"], accept_multiple_files=True)
 
-    if uploaded_file is not None:
+    if uploaded_files:
         if st.sidebar.button("Processar Importação"):
             try:
-                csv_df = pd.read_csv(uploaded_file)
-                required_cols = ['Date', 'Transaction Description', 'Category', 'Amount', 'Type']
+                # Valida só os cabeçalhos aqui; os arquivos são processados em segundo plano
+                required_cols = crud.IMPORT_REQUIRED_COLUMNS
+                invalid = [
+                    f.name for f in uploaded_files
+                    if not all(col in pd.read_csv(f, nrows=0).columns for col in required_cols)
+                ]
                 
-                if not all(col in csv_df.columns for col in required_cols):
-                    st.sidebar.error(f"O CSV precisa ter as colunas: {', '.join(required_cols)}")
+                if invalid:
+                    st.sidebar.error(f"O CSV precisa ter as colunas: {', '.join(required_cols)} ({', '.join(invalid)})")
+                elif len(uploaded_files) == 1:
+                    job = importer.start_import(db, uploaded_files[0].name, uploaded_files[0].getvalue())
+                    st.session_state['import_job_id'] = job.id
                 else:
-                    count_new_cats = 0
-                    count_trans = 0
-                    processing_status = st.sidebar.empty()
-                    processing_status.info("Processando... Por favor, aguarde.")
-
-                    for index, row in csv_df.iterrows():
-                        # A. TRATAMENTO DA CATEGORIA
-                        cat_name = str(row['Category']).strip()
-                        category_obj = crud.get_category_by_name(db, cat_name)
-                        if not category_obj:
-                            category_obj = crud.create_category(db, cat_name)
-                            count_new_cats += 1
-                        
-                        # B. TRATAMENTO DO VALOR (Sinal Negativo/Positivo)
-                        raw_amount = float(row['Amount'])
-                        trans_type = str(row['Type']).strip().lower() 
-                        
-                        if 'expense' in trans_type: 
-                            final_amount = -abs(raw_amount)
-                        else:
-                            final_amount = abs(raw_amount)
-
-                        # C. TRATAMENTO DA DATA
-                        trans_date = pd.to_datetime(row['Date']).to_pydatetime()
-                        
-                        # D. SALVAR NO BANCO
-                        new_trans = models.TransactionCreate(
-                            amount=final_amount,
-                            description=str(row['Transaction Description']),
-                            category_id=category_obj.id,
-                            date=trans_date
-                        )
-                        crud.create_transaction(db, new_trans)
-                        count_trans += 1
-                        
-                    processing_status.empty() 
-                    st.sidebar.success(f"Sucesso! {count_trans} transações importadas.")
-                    if count_new_cats > 0:
-                        st.sidebar.info(f"{count_new_cats} novas categorias criadas.")
-                    
-                    # --- LIMPEZA DE CACHE APÓS INSERÇÃO ---
-                    fetch_data_to_df.clear() # NOVO: Limpa o cache para que a próxima leitura seja fresca
-                    st.rerun() 
+                    # Vários arquivos: leitura em paralelo (pool de processos) e um único gravador
+                    job = importer.start_batch_import(db, [(f.name, f.getvalue()) for f in uploaded_files])
+                    st.session_state['import_job_id'] = job.id
                         
             except Exception as e:
                 st.sidebar.error(f"Erro ao processar: Verifique formato do CSV e conexão. Erro: {e}")
 
+    if 'import_job_id' in st.session_state:
+        with st.sidebar:
+            show_import_progress(st.session_state['import_job_id'])
+
     st.sidebar.markdown("---")
     
     # ==========================================
@@ -138,9 +230,9 @@ def main_app():
                 # 3. MENSAGEM DE SUCESSO
                 st.success("Transação salva com sucesso! 🎉")
 
-                # Limpa o cache da função que busca os dados. 
-                # Isso obriga o Streamlit a ir no banco buscar TUDO de novo (antigos + novos)
-                fetch_data_to_df.clear() 
+                # Limpa o cache do resumo agregado. O DataFrame de transações
+                # busca apenas a nova linha (delta) no próximo rerun.
+                fetch_dashboard_summary.clear()
                 
                 # Recarrega a página imediatamente para atualizar os gráficos
                 st.rerun() 
@@ -151,22 +243,30 @@ def main_app():
     # --- INÍCIO DO DASHBOARD ---
     st.title("💸 Sistema de Análise Financeira")
 
-    # 1. LEITURA E PREPARAÇÃO DE DADOS (USANDO A FUNÇÃO CACHEADA)
-    # Garante que a função só é executada se o cache for limpo ou expirar
+    # 1. LEITURA E PREPARAÇÃO DE DADOS (USANDO O CACHE INCREMENTAL)
+    # Só a janela que as análises precisam (N meses anteriores + mês atual) é lida
+    # linha a linha; o histórico longo vem dos totais mensais pré-calculados.
+    today = datetime.now()
+    window_start, _ = analyzer.analysis_window(today, MONTHS_TO_COMPARE)
     try:
-        # Troca para o underscore na chamada:
-        df = fetch_data_to_df(db) # Corrigido para passar 'db' como '_db_session'
+        df, data_version = fetch_data_to_df(db, start=window_start)
+        summary = fetch_dashboard_summary(db, analyzer.ANALYZER_BACKEND)
     except Exception as e:
         st.error(f"Erro ao carregar dados: {e}. Verifique a conexão com o PostgreSQL.")
-        df = pd.DataFrame() 
+        df, data_version, summary = pd.DataFrame(), None, None
 
-    if df.empty:
+    if summary is None or (df.empty and summary['balance'].empty):
         st.info("Nenhum dado encontrado. Use a barra lateral para adicionar dados.")
         return 
         
-    balance_df = analyzer.calculate_monthly_balance(df)
-    category_averages = analyzer.calculate_category_averages(df)
-    insights = analyzer.generate_insights(df, category_averages)
+    # Gráfico de saldo e pizza: totais agregados (tabela de totais ou GROUP BY no
+    # banco, conforme ANALYZER_BACKEND). Médias e alertas: janela recente.
+    balance_df = summary['balance']
+    # Memoizadas pela versão dos dados: reruns sem escrita não refazem a análise
+    category_averages = analyzer.calculate_category_averages(
+        df, MONTHS_TO_COMPARE, reference_date=today, data_version=data_version
+    )
+    insights = analyzer.generate_insights(df, category_averages, reference_date=today, data_version=data_version)
 
     # ... (Métricas, Alertas, Gráficos e Tabela de Dados Brutos) ...
     
@@ -195,26 +295,46 @@ def main_app():
     # VISUALIZAÇÕES GRÁFICAS
     st.header("Visualizações Históricas")
     
-    fig_balance = px.line(
-        balance_df, 
-        x=balance_df.apply(lambda row: f"{row['Year'].astype(int)}-{row['Month'].astype(int):02d}", axis=1), 
-        y="Balance", 
-        title="Evolução do Saldo Mensal",
-        labels={'x': 'Mês', 'Balance': 'Saldo (R$)'}
-    )
-    st.plotly_chart(fig_balance, use_container_width=True)
+    import plotly.express as px # Importação pesada: adiada até a primeira renderização
+
+    # Payloads prontos (rótulos vetorizados, tamanho limitado), em cache junto com o resumo
+    line_df = summary['balance_line']
+    with instrumentation.span("render.balance_chart"):
+        fig_balance = px.line(
+            line_df, 
+            x='Mês', 
+            y="Balance", 
+            title="Evolução do Saldo Mensal",
+            labels={'Balance': 'Saldo (R$)'}
+        )
+        st.plotly_chart(fig_balance, use_container_width=True)
     
-    fig_pie = px.pie(
-        df[df['amount'] < 0].groupby('category_name')['amount'].sum().abs().reset_index(), 
-        values='amount', 
-        names='category_name', 
-        title='Distribuição de Despesas por Categoria'
-    )
-    st.plotly_chart(fig_pie, use_container_width=True)
+    pie_df = summary['pie_payload']
+    with instrumentation.span("render.pie_chart"):
+        fig_pie = px.pie(
+            pie_df, 
+            values='expense', 
+            names='category_name', 
+            title='Distribuição de Despesas por Categoria'
+        )
+        st.plotly_chart(fig_pie, use_container_width=True)
 
     # VISUALIZAÇÃO DE DADOS BRUTOS
     with st.expander("Ver Transações Recentes"):
-        st.dataframe(df.sort_values(by='date', ascending=False), use_container_width=True)
+        # Só uma página vai ao navegador: ordenada no banco e paginada por keyset.
+        # A pilha guarda o cursor (date, id) do início de cada página visitada.
+        cursors = st.session_state.setdefault('raw_page_cursors', [None])
+        page_df = crud.get_transactions_page(db, before=cursors[-1], limit=RAW_PAGE_SIZE)
+        st.dataframe(page_df, use_container_width=True, hide_index=True)
+
+        col_prev, col_next = st.columns(2)
+        if col_prev.button("Página anterior", disabled=len(cursors) == 1):
+            cursors.pop()
+            st.rerun()
+        if col_next.button("Próxima página", disabled=len(page_df) < RAW_PAGE_SIZE):
+            last = page_df.iloc[-1]
+            cursors.append((last['date'].to_pydatetime(), int(last['id'])))
+            st.rerun()
 
 # Chamada principal da aplicação
 if __name__ == '__main__':
@@ -0,0 +1,196 @@
+"""
+Cache incremental do DataFrame de transações.
+
+Em vez de reler a tabela inteira a cada escrita (ou a cada expiração de TTL),
+o cache guarda o DataFrame carregado e a marca d'água (maior id lido).
+Em cada atualização, uma verificação barata de versão (contagem + somas)
+confere se as linhas já carregadas continuam iguais; se sim, busca apenas
+as transações novas (id > marca d'água) e as anexa ao DataFrame.
+Uma recarga completa só acontece quando há exclusões ou alterações.
+
+Em um processo novo, o cache parte do snapshot colunar em disco (ver
+snapshot.py), se existir e ainda for válido, e busca no banco só o delta.
+"""
+import math
+import threading
+from datetime import datetime
+from typing import Any, Dict, Hashable, Optional, Tuple
+
+import pandas as pd
+from pandas.api.types import union_categoricals
+from sqlalchemy.orm import Session
+
+from src import crud, snapshot
+
+# Regrava o snapshot em disco depois de acumular esta quantidade de linhas novas
+SNAPSHOT_MIN_DELTA_ROWS = 1000
+
+
+class TransactionCache:
+    """
+    DataFrame de transações compartilhado, com atualização por delta.
+
+    Usa o layout compacto de crud.compact_transactions_dataframe, sem a coluna
+    'description'. Pode guardar só as transações a partir de uma data (janela
+    do dashboard); mudar a data inicial recarrega o cache. O DataFrame
+    retornado é compartilhado entre sessões: trate-o como somente leitura.
+    """
+
+    def __init__(self, snapshot_path: Optional[str] = None):
+        self._lock = threading.Lock()
+        self._df: Optional[pd.DataFrame] = None
+        self._version: Optional[Dict[str, Any]] = None
+        self._start: Optional[datetime] = None
+        self._snapshot_path = snapshot_path
+        self._rows_since_snapshot = 0
+        self.full_loads = 0
+        self.delta_loads = 0
+        self.snapshot_loads = 0
+
+    @property
+    def high_water_mark(self) -> int:
+        """Maior id de transação já carregado."""
+        return self._version["max_id"] if self._version else 0
+
+    def invalidate(self) -> None:
+        """Descarta o cache; a próxima leitura recarrega tudo do banco."""
+        with self._lock:
+            self._df = None
+            self._version = None
+
+    def get(self, db: Session, start: Optional[datetime] = None) -> pd.DataFrame:
+        """
+        Retorna o DataFrame atualizado, buscando no banco apenas o que mudou.
+
+        Args:
+            db: Sessão ativa do banco de dados (SQLAlchemy).
+            start: Se informado, mantém apenas as transações com date >= start.
+        """
+        return self.get_versioned(db, start)[0]
+
+    def get_versioned(self, db: Session, start: Optional[datetime] = None) -> Tuple[pd.DataFrame, Hashable]:
+        """
+        Como get, mas retorna também a versão das linhas retornadas, lida sob o
+        mesmo lock (chave do memo das análises, ver analyzer.analysis_memo).
+        """
+        with self._lock:
+            if self._df is None or start != self._start or not self._loaded_rows_unchanged(db):
+                self._start = start
+                self._full_load(db)
+            else:
+                self._append_delta(db)
+            return self._df, self._version_key()
+
+    def refresh_snapshot(self, db: Session, start: Optional[datetime] = None) -> bool:
+        """
+        Atualiza o cache e regrava o snapshot local, mesmo com poucas linhas
+        novas (ex.: após uma importação pela CLI, antes do app reiniciar).
+
+        Returns:
+            True se o snapshot foi gravado (False se estiver desativado).
+        """
+        self.get_versioned(db, start)
+        with self._lock:
+            return self._save_snapshot(db)
+
+    # --- Internos ---
+    def _loaded_rows_unchanged(self, db: Session) -> bool:
+        """Compara a versão das linhas id <= marca d'água com a versão guardada."""
+        current = crud.get_transactions_version(db, max_id=self.high_water_mark, start=self._start)
+        return (
+            current["count"] == self._version["count"]
+            and current["category_sum"] == self._version["category_sum"]
+            and current["category_id_sum"] == self._version["category_id_sum"]
+            and current["date_sum"] == self._version["date_sum"]
+            and math.isclose(current["amount_sum"], self._version["amount_sum"], rel_tol=1e-9, abs_tol=1e-6)
+        )
+
+    def _full_load(self, db: Session) -> None:
+        source = snapshot.source_key(db.bind.url)
+
+        # 1. Tenta partir do snapshot local e buscar no banco apenas o delta
+        loaded = snapshot.load_snapshot(source, self._snapshot_path)
+        if loaded is not None and loaded[1].get("start") == self._start_key():
+            self._df, self._version = loaded
+            if self._loaded_rows_unchanged(db):
+                self.snapshot_loads += 1
+                self._append_delta(db)
+                return
+
+        # 2. Snapshot ausente ou desatualizado: recarrega tudo e regrava o snapshot
+        self._df = self._read(db)
+        self._version = {**self._version_of(self._df), "start": self._start_key()}
+        self.full_loads += 1
+        self._save_snapshot(db)
+
+    def _append_delta(self, db: Session) -> None:
+        delta = self._read(db, min_id=self.high_water_mark)
+        if delta.empty:
+            return
+
+        delta_version = self._version_of(delta)
+        self._df = self._concat(self._df, delta)
+        self._version = {
+            "count": self._version["count"] + delta_version["count"],
+            "max_id": delta_version["max_id"],
+            "amount_sum": self._version["amount_sum"] + delta_version["amount_sum"],
+            "category_sum": self._version["category_sum"] + delta_version["category_sum"],
+            "category_id_sum": self._version["category_id_sum"] + delta_version["category_id_sum"],
+            "date_sum": self._version["date_sum"] + delta_version["date_sum"],
+            "start": self._start_key(),
+        }
+        self.delta_loads += 1
+
+        self._rows_since_snapshot += len(delta)
+        if self._rows_since_snapshot >= SNAPSHOT_MIN_DELTA_ROWS:
+            self._save_snapshot(db)
+
+    def _save_snapshot(self, db: Session) -> bool:
+        saved = snapshot.save_snapshot(self._df, self._version, snapshot.source_key(db.bind.url), self._snapshot_path)
+        self._rows_since_snapshot = 0
+        return saved
+
+    def _version_key(self) -> Hashable:
+        v = self._version
+        return (
+            v["start"], v["count"], v["max_id"], v["amount_sum"],
+            v["category_sum"], v["category_id_sum"], v["date_sum"],
+        )
+
+    def _start_key(self) -> Optional[str]:
+        """Data inicial serializável (guardada na versão do snapshot)."""
+        return self._start.isoformat() if self._start else None
+
+    def _read(self, db: Session, min_id: Optional[int] = None) -> pd.DataFrame:
+        return crud.get_transactions_dataframe(
+            db, start=self._start, min_id=min_id, compact=True, include_description=False
+        )
+
+    @staticmethod
+    def _concat(df: pd.DataFrame, delta: pd.DataFrame) -> pd.DataFrame:
+        """
+        Anexa o delta preservando as colunas Categorical (une as categorias).
+        As categorias dos dois lados são convertidas para str antes da união:
+        um cache vazio (ou um snapshot antigo) pode tê-las com dtype 'object'.
+        """
+        combined = pd.concat([df, delta], ignore_index=True)
+        for col in df.select_dtypes("category").columns:
+            parts = [part[col].cat.rename_categories(part[col].cat.categories.astype(str)) for part in (df, delta)]
+            combined[col] = pd.Categorical(union_categoricals(parts, ignore_order=True))
+        return combined
+
+    @staticmethod
+    def _version_of(df: pd.DataFrame) -> Dict[str, Any]:
+        """Mesma versão de crud.get_transactions_version, calculada sobre as linhas lidas."""
+        return {
+            "count": len(df),
+            "max_id": int(df["id"].max()) if not df.empty else 0,
+            "amount_sum": int(df["amount_cents"].sum()) / 100,
+            "category_sum": int(df["category_id"].sum()),
+            "category_id_sum": int((df["id"].astype("int64") * df["category_id"].astype("int64")).sum()),
+            "date_sum": int((
+                df["date"].dt.year.astype("int64") * 372
+                + df["date"].dt.month.astype("int64") * 31
+                + df["date"].dt.day.astype("int64")
+            ).sum()),
+        }
@@ -0,0 +1,74 @@
+"""
+Dados prontos para os gráficos do dashboard.
+
+Os rótulos de período são montados de forma vetorizada (sem apply por linha)
+e os payloads são limitados em tamanho (últimos N meses na linha, maiores
+categorias na pizza), para que o custo de renderização e o volume enviado ao
+navegador não cresçam com o histórico. Com `data_version`, os payloads vêm do
+memo das análises (ver analyzer.analysis_memo).
+"""
+import os
+
+import pandas as pd
+
+from src.analyzer import memoized
+from src.instrumentation import traced
+
+# Meses exibidos no gráfico de saldo (os mais recentes)
+CHART_MAX_MONTHS = int(os.getenv("CHART_MAX_MONTHS", "36"))
+
+# Fatias da pizza; as categorias menores são somadas em "Outras"
+CHART_MAX_SLICES = int(os.getenv("CHART_MAX_SLICES", "10"))
+
+OTHER_CATEGORIES_LABEL = "Outras"
+
+
+def period_labels(year: pd.Series, month: pd.Series) -> pd.Series:
+    """Rótulos 'AAAA-MM' calculados por coluna inteira."""
+    return year.astype(int).astype(str) + '-' + month.astype(int).astype(str).str.zfill(2)
+
+
+@memoized
+@traced
+def balance_line_payload(balance_df: pd.DataFrame, max_months: int = CHART_MAX_MONTHS) -> pd.DataFrame:
+    """
+    Pontos do gráfico de evolução do saldo.
+
+    Args:
+        balance_df: Saldo mensal (colunas 'Year', 'Month' e 'Balance'), em ordem cronológica.
+        max_months: Quantidade de meses mais recentes mantidos.
+
+    Returns:
+        DataFrame com colunas 'Mês' e 'Balance'.
+    """
+    recent = balance_df.tail(max_months)
+    return pd.DataFrame({
+        'Mês': period_labels(recent['Year'], recent['Month']).to_numpy(),
+        'Balance': recent['Balance'].to_numpy(),
+    })
+
+
+@memoized
+@traced
+def pie_payload(pie_df: pd.DataFrame, max_slices: int = CHART_MAX_SLICES) -> pd.DataFrame:
+    """
+    Fatias do gráfico de distribuição de despesas.
+
+    Args:
+        pie_df: Gasto total por categoria (colunas 'category_name' e 'expense').
+        max_slices: Número máximo de fatias; o restante vira "Outras".
+
+    Returns:
+        DataFrame com colunas 'category_name' e 'expense', do maior para o menor gasto.
+    """
+    ranked = pie_df[['category_name', 'expense']].sort_values('expense', ascending=False, ignore_index=True)
+    ranked['category_name'] = ranked['category_name'].astype(str)
+    if len(ranked) <= max_slices:
+        return ranked
+
+    top = ranked.head(max_slices - 1)
+    other = pd.DataFrame({
+        'category_name': [OTHER_CATEGORIES_LABEL],
+        'expense': [ranked['expense'].iloc[max_slices - 1:].sum()],
+    })
+    return pd.concat([top, other], ignore_index=True)
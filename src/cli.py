@@ -0,0 +1,249 @@
+"""
+Comandos de manutenção executados fora do Streamlit.
+Uso: python -m src <comando>
+
+Os módulos de src (pandas, SQLAlchemy, driver do banco) são importados dentro
+de cada comando, para que '--help' e os erros de argumento respondam na hora.
+Nenhum comando importa streamlit ou plotly: a CLI pode rodar em um container
+enxuto (cron, job agendado ou sidecar) com o mesmo banco do app.
+
+Códigos de saída (para cron e orquestradores):
+    0  sucesso
+    1  falha (banco indisponível, arquivo inválido...) ou verificação reprovada
+    2  argumentos inválidos
+    3  'analyze --fail-on-alert' encontrou alertas no mês de referência
+"""
+import argparse
+import json
+import os
+import sys
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2
+EXIT_ALERTS = 3
+
+
+def _refresh_snapshot(db) -> bool:
+    """
+    Regrava o snapshot do cache de transações com a mesma janela do dashboard
+    (ANOMALY_WINDOW meses), para que o app (re)iniciado já encontre os dados importados.
+    """
+    from src import analyzer, anomalies, snapshot
+    from src.cache import TransactionCache
+
+    if not snapshot.is_enabled():
+        return False
+    window_start, _ = analyzer.analysis_window(datetime.now(), anomalies.ANOMALY_WINDOW)
+    return TransactionCache().refresh_snapshot(db, start=window_start)
+
+
+def cmd_init(args: argparse.Namespace) -> int:
+    """Cria/atualiza o esquema e os totais mensais (passo de deploy, antes de subir o app)."""
+    from src import migrations
+
+    actions = migrations.ensure_schema()
+    for action in actions:
+        print(action)
+    print(f"Banco inicializado: {len(actions)} alteração(ões) de esquema.")
+    return EXIT_OK
+
+
+def cmd_rebuild(args: argparse.Namespace) -> int:
+    """Recria a tabela agregada 'monthly_category_totals' e o snapshot do cache."""
+    from src import crud, database, migrations
+
+    migrations.ensure_schema()
+    with database.session_scope() as db:
+        rows = crud.rebuild_monthly_totals(db)
+        print(f"Totais mensais recriados: {rows} linhas (mês x categoria).")
+        if not args.no_snapshot and _refresh_snapshot(db):
+            print("Snapshot do cache de transações atualizado.")
+    return EXIT_OK
+
+
+def cmd_import(args: argparse.Namespace) -> int:
+    """Importa CSVs (arquivos ou diretórios) lendo os arquivos em paralelo."""
+    from src import database, importer, migrations
+
+    paths: List[str] = []
+    for path in args.paths:
+        paths.extend(importer.list_csv_files(path) if os.path.isdir(path) else [path])
+    if not paths:
+        print("Nenhum arquivo CSV encontrado.", file=sys.stderr)
+        return EXIT_ERROR
+
+    migrations.ensure_schema()
+    with database.session_scope() as db:
+        # Os totais mensais são atualizados na própria importação
+        result = importer.import_files(db, paths, max_workers=args.workers or importer.IMPORT_PARSE_PROCESSES)
+        print(
+            f"{result['transactions']} transações importadas de {result['files']} arquivo(s) "
+            f"({result['skipped']} já existentes ignoradas); "
+            f"{result['new_categories']} novas categorias."
+        )
+        if result['transactions'] and not args.no_snapshot and _refresh_snapshot(db):
+            print("Snapshot do cache de transações atualizado.")
+    return EXIT_OK
+
+
+def build_analysis_report(
+    db,
+    reference_date: datetime,
+    months_to_compare: int = 3,
+    stream: bool = False,
+    history: bool = False
+) -> Dict[str, Any]:
+    """
+    Alertas do mês de referência (mesmo formato de analyzer.generate_insights)
+    e, opcionalmente, de todo o histórico, como um dicionário serializável.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        reference_date: Data do "mês atual".
+        months_to_compare: Número de meses para a média histórica.
+        stream: Recalcula os totais lendo as transações em blocos (memória
+            limitada), em vez de usar a tabela agregada.
+        history: Inclui os alertas de todos os meses (analyzer.insights_history).
+    """
+    from src import analyzer, crud
+
+    if stream:
+        totals = analyzer.build_monthly_totals_from_chunks(crud.iter_transactions_dataframes(db))
+    else:
+        totals = crud.get_monthly_totals_dataframe(db)
+
+    summary = analyzer.summarize_totals(totals, months_to_compare, reference_date)
+    insights = analyzer.build_insights(summary['current_totals'], summary['category_averages'])
+    report: Dict[str, Any] = {
+        'reference_month': reference_date.strftime('%Y-%m'),
+        'months_to_compare': months_to_compare,
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'alerts': sum(1 for insight in insights if "ALERTA" in insight['type']),
+        'insights': insights,
+        'current_totals': summary['current_totals'],
+        'category_averages': summary['category_averages'],
+    }
+    if history:
+        flagged = analyzer.insights_history(totals, window=months_to_compare)
+        columns = ['year', 'month', 'category_name', 'expense', 'baseline', 'type', 'diff_percent']
+        report['history'] = json.loads(flagged[columns].to_json(orient='records', force_ascii=False))
+    return report
+
+
+def cmd_analyze(args: argparse.Namespace) -> int:
+    """
+    Calcula os alertas do mês e grava o resultado em JSON (stdout ou arquivo).
+    Somente leitura: não aplica migrações (ver 'init' e 'migrate').
+    """
+    from src import anomalies, database, migrations
+
+    missing = migrations.missing_schema(database.get_engine())
+    if missing:
+        print(
+            f"Esquema do banco desatualizado (faltam: {', '.join(missing)}). "
+            "Rode 'python -m src init' ou 'python -m src migrate'.",
+            file=sys.stderr,
+        )
+        return EXIT_ERROR
+    with database.session_scope() as db:
+        months = args.months or anomalies.ANOMALY_WINDOW
+        report = build_analysis_report(db, args.month, months, args.stream, args.history)
+
+    output = json.dumps(report, ensure_ascii=False, indent=2, default=float)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+
+    if args.fail_on_alert and report['alerts']:
+        return EXIT_ALERTS
+    return EXIT_OK
+
+
+def cmd_migrate(args: argparse.Namespace) -> int:
+    """Atualiza o esquema de um banco existente (índices) e, opcionalmente, verifica o EXPLAIN."""
+    from src import database, migrations
+
+    actions = migrations.upgrade_schema(database.get_engine())
+    for action in actions:
+        print(action)
+    print(f"Esquema atualizado: {len(actions)} alteração(ões).")
+
+    if args.check:
+        dialect = database.get_engine().dialect.name
+        if dialect not in migrations.EXPLAIN_DIALECTS:
+            print(f"Verificação via EXPLAIN ignorada: não suportada para '{dialect}'.")
+            return EXIT_OK
+        results = migrations.explain_index_usage(database.get_engine())
+        for name, result in results.items():
+            status = f"OK ({result['index']})" if result["uses_index"] else f"SEM {result['index']}"
+            print(f"[{status}] {name}\n{result['plan']}")
+        if not all(result["uses_index"] for result in results.values()):
+            return EXIT_ERROR
+    return EXIT_OK
+
+
+def _parse_month(value: str) -> datetime:
+    try:
+        return datetime.strptime(value, "%Y-%m")
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"mês inválido: {value!r} (use AAAA-MM)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(prog="python -m src", description="Sistema de Análise Financeira")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    init = subparsers.add_parser("init", help="Cria/atualiza o esquema do banco e os totais mensais (deploy)")
+    init.set_defaults(func=cmd_init)
+
+    rebuild = subparsers.add_parser("rebuild", help="Recria os totais mensais agregados a partir das transações")
+    rebuild.add_argument("--no-snapshot", action="store_true", help="Não regrava o snapshot do cache de transações")
+    rebuild.set_defaults(func=cmd_rebuild)
+
+    import_cmd = subparsers.add_parser("import", help="Importa arquivos CSV (ou diretórios com CSVs)")
+    import_cmd.add_argument("paths", nargs="+", help="Arquivos .csv ou diretórios")
+    import_cmd.add_argument("--workers", type=int, default=None,
+                            help="Processos para ler os arquivos em paralelo (padrão: IMPORT_PARSE_PROCESSES ou número de CPUs)")
+    import_cmd.add_argument("--no-snapshot", action="store_true", help="Não regrava o snapshot do cache de transações")
+    import_cmd.set_defaults(func=cmd_import)
+
+    analyze = subparsers.add_parser("analyze", help="Gera os alertas do mês em JSON")
+    analyze.add_argument("--month", type=_parse_month, default=datetime.now(),
+                         help="Mês de referência, AAAA-MM (padrão: mês atual)")
+    analyze.add_argument("--months", type=int, default=None,
+                         help="Meses completos anteriores na média histórica (padrão: ANOMALY_WINDOW, 3)")
+    analyze.add_argument("--stream", action="store_true",
+                         help="Recalcula os totais lendo as transações em blocos, sem a tabela agregada")
+    analyze.add_argument("--history", action="store_true", help="Inclui os alertas de todos os meses do histórico")
+    analyze.add_argument("--output", help="Grava o JSON neste arquivo (padrão: stdout)")
+    analyze.add_argument("--fail-on-alert", action="store_true",
+                         help=f"Sai com código {EXIT_ALERTS} se houver alertas no mês de referência")
+    analyze.set_defaults(func=cmd_analyze)
+
+    migrate = subparsers.add_parser("migrate", help="Aplica as migrações de esquema (índices) em um banco existente")
+    migrate.add_argument("--check", action="store_true", help="Verifica via EXPLAIN se as consultas usam os índices")
+    migrate.set_defaults(func=cmd_migrate)
+
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)  # Argumentos inválidos: sai com EXIT_USAGE
+    try:
+        return args.func(args)
+    except Exception as e:
+        print(f"Erro em '{args.command}': {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        # INSTRUMENTATION_ENABLED=1: métricas do comando (spans, consultas, linhas) no log
+        from src import instrumentation
+        instrumentation.log_metrics_snapshot()
+
+
+if __name__ == '__main__':
+    sys.exit(main())
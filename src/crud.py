@@ -1,11 +1,28 @@
+from sqlalchemy import BigInteger, Integer, and_, bindparam, case, cast, delete, extract, func, insert, or_, select, update
+from sqlalchemy.exc import IntegrityError
 from sqlalchemy.orm import Session
-from src import models
-from src.models import Transaction, Category, TransactionCreate
-from typing import List, Optional
+from src import analyzer, analyzer_sql, models
+from src.instrumentation import read_sql, traced
+from src.models import Transaction, Category, MonthlyCategoryTotal, TransactionCreate
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 from datetime import datetime
 import pandas as pd
+import hashlib
 import io
 
+# Colunas obrigatórias no CSV de importação (formato do dataset do Kaggle)
+IMPORT_REQUIRED_COLUMNS = ['Date', 'Transaction Description', 'Category', 'Amount', 'Type']
+
+# Categoria das linhas do CSV com a célula 'Category' vazia
+DEFAULT_IMPORT_CATEGORY = "Sem Categoria"
+
+# Quantidade de linhas por INSERT em lote. Mantém cada comando abaixo do
+# limite de 2100 parâmetros do SQL Server (5 colunas x 400 linhas).
+BULK_INSERT_CHUNK_SIZE = 400
+
+# Linhas por bloco na leitura em streaming (iter_transactions_dataframes)
+STREAM_CHUNK_SIZE = 50000
+
 # --- Funções CRUD de Transações ---
 def create_transaction(db: Session, transaction: TransactionCreate) -> Transaction:
     """
@@ -18,8 +35,11 @@ def create_transaction(db: Session, transaction: TransactionCreate) -> Transacti
     # Converte o objeto Pydantic em um dicionário para o modelo SQLAlchemy
     # Usando .model_dump() para compatibilidade com Pydantic v2
     db_transaction = Transaction(**transaction.model_dump()) 
+    db_transaction.content_hash = _next_free_content_hash(db, transaction)
     
     db.add(db_transaction)
+    # Mantém a tabela agregada em dia na mesma transação
+    apply_monthly_totals(db, pd.DataFrame([transaction.model_dump()]))
     db.commit()      # Salva no banco
     db.refresh(db_transaction) # Atualiza o objeto com o ID gerado
     
@@ -61,25 +81,626 @@ def get_category_by_name(db: Session, name: str):
     return db.query(Category).filter(Category.name == name).first()
 
 
+@traced
+def get_or_create_categories(db: Session, names: Iterable[str]) -> Tuple[Dict[str, int], int]:
+    """
+    Resolve (ou cria) várias categorias de uma vez, sem fazer commit.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        names: Nomes das categorias (duplicados são ignorados).
+
+    Returns:
+        Tupla com o dicionário nome -> ID e o número de categorias criadas.
+    """
+    unique_names = sorted(set(names))
+    mapping: Dict[str, int] = {}
+
+    # 1. Busca as categorias existentes em lotes (limite de parâmetros do SQL Server)
+    for start in range(0, len(unique_names), BULK_INSERT_CHUNK_SIZE):
+        chunk = unique_names[start:start + BULK_INSERT_CHUNK_SIZE]
+        rows = db.query(Category.id, Category.name).filter(Category.name.in_(chunk)).all()
+        mapping.update({name: cat_id for cat_id, name in rows})
+
+    # 2. Insere apenas as que faltam e busca os IDs gerados
+    missing = [name for name in unique_names if name not in mapping]
+    for start in range(0, len(missing), BULK_INSERT_CHUNK_SIZE):
+        chunk = missing[start:start + BULK_INSERT_CHUNK_SIZE]
+        db.execute(insert(Category), [{"name": name} for name in chunk])
+        rows = db.query(Category.id, Category.name).filter(Category.name.in_(chunk)).all()
+        mapping.update({name: cat_id for cat_id, name in rows})
+
+    return mapping, len(missing)
+
+
+# --- Importação em Lote (CSV) ---
+def normalize_import_dataframe(csv_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Normaliza o CSV bruto de forma vetorizada (sem laço por linha).
+
+    Args:
+        csv_df: DataFrame lido do CSV, com as colunas de IMPORT_REQUIRED_COLUMNS.
+
+    Returns:
+        DataFrame com colunas 'date', 'amount' (negativo para despesas),
+        'description' e 'category_name'.
+    """
+    missing_cols = [col for col in IMPORT_REQUIRED_COLUMNS if col not in csv_df.columns]
+    if missing_cols:
+        raise ValueError(f"O CSV precisa ter as colunas: {', '.join(IMPORT_REQUIRED_COLUMNS)}")
+
+    # A. Valor: despesas ficam negativas, o resto positivo
+    raw_amount = pd.to_numeric(csv_df['Amount']).astype(float).abs()
+    is_expense = csv_df['Type'].fillna('').astype(str).str.strip().str.lower().str.contains('expense', regex=False)
+
+    return pd.DataFrame({
+        # B. Data: 'mixed' mantém a inferência por valor da importação antiga
+        'date': pd.to_datetime(csv_df['Date'], format='mixed'),
+        'amount': raw_amount.where(~is_expense, -raw_amount),
+        # Células vazias: fillna antes de astype(str), que mantém NaN em versões recentes do pandas
+        'description': csv_df['Transaction Description'].fillna('').astype(str),
+        # C. Categoria: remove espaços para evitar duplicações; vazia vira a categoria padrão
+        'category_name': csv_df['Category'].fillna('').astype(str).str.strip().replace('', DEFAULT_IMPORT_CATEGORY),
+    })
+
+
+def bulk_import_transactions(
+    db: Session,
+    csv_df: pd.DataFrame,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    commit: bool = True
+) -> Dict[str, int]:
+    """
+    Importa um CSV inteiro em uma única transação do banco.
+
+    As categorias distintas são resolvidas de uma vez e as transações são
+    inseridas em lotes (executemany), em vez de um commit por linha.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        csv_df: DataFrame lido do CSV, com as colunas de IMPORT_REQUIRED_COLUMNS.
+        chunk_size: Número de linhas por comando INSERT.
+        commit: Se False, deixa o commit para quem chamou (ex.: gravar o
+            checkpoint de um job de importação na mesma transação).
+
+    Returns:
+        Dicionário com 'transactions' (linhas inseridas), 'skipped' (linhas
+        que já existiam no banco) e 'new_categories' (categorias criadas).
+    """
+    return bulk_insert_transactions(db, normalize_import_dataframe(csv_df), chunk_size, commit)
+
+
+@traced
+def bulk_insert_transactions(
+    db: Session,
+    normalized: pd.DataFrame,
+    chunk_size: int = BULK_INSERT_CHUNK_SIZE,
+    commit: bool = True,
+    category_ids: Optional[Dict[str, int]] = None
+) -> Dict[str, int]:
+    """
+    Grava transações já normalizadas (ver normalize_import_dataframe) em lote.
+
+    Linhas que já existem no banco (mesmo 'content_hash') são descartadas com
+    uma única consulta por lote de hashes (anti-join), não uma por linha.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        normalized: DataFrame com 'date', 'amount', 'description' e 'category_name';
+            'content_hash' é calculado aqui se ainda não existir (ver add_content_hashes).
+        chunk_size: Número de linhas por comando INSERT.
+        commit: Se False, deixa o commit para quem chamou.
+        category_ids: Mapa nome -> ID já resolvido (ex.: uma vez para vários
+            arquivos); se omitido, as categorias são resolvidas aqui.
+
+    Returns:
+        Dicionário com 'transactions', 'skipped' e 'new_categories'.
+    """
+    if normalized.empty:
+        return {"transactions": 0, "skipped": 0, "new_categories": 0}
+
+    try:
+        if 'content_hash' not in normalized.columns:
+            normalized = add_content_hashes(normalized)
+        # Anti-join: remove repetidos no próprio lote (arquivos sobrepostos) e os já gravados
+        fresh = normalized.drop_duplicates('content_hash')
+        fresh = fresh[~fresh['content_hash'].isin(existing_content_hashes(db, fresh['content_hash']))]
+        skipped = len(normalized) - len(fresh)
+        if fresh.empty:
+            return {"transactions": 0, "skipped": skipped, "new_categories": 0}
+        normalized = fresh
+
+        new_categories = 0
+        if category_ids is None:
+            category_ids, new_categories = get_or_create_categories(db, normalized['category_name'])
+
+        # Converte para tipos nativos do Python antes de enviar ao driver
+        records = [
+            {
+                "date": date, "amount": amount, "description": description,
+                "category_id": category_id, "content_hash": content_hash,
+            }
+            for date, amount, description, category_id, content_hash in zip(
+                normalized['date'].dt.to_pydatetime().tolist(),
+                normalized['amount'].tolist(),
+                normalized['description'].astype(object).where(normalized['description'].notna(), None).tolist(),
+                normalized['category_name'].map(category_ids).astype(int).tolist(),
+                normalized['content_hash'].tolist(),
+            )
+        ]
+
+        for start in range(0, len(records), chunk_size):
+            db.execute(insert(Transaction), records[start:start + chunk_size])
+
+        apply_monthly_totals(db, pd.DataFrame.from_records(records))
+        if commit:
+            db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return {"transactions": len(records), "skipped": skipped, "new_categories": new_categories}
+
+
+# --- Deduplicação por hash de conteúdo ---
+def content_keys(normalized: pd.DataFrame) -> pd.Series:
+    """
+    Chave textual normalizada de cada transação: data, valor em centavos,
+    descrição e categoria (sem diferença de caixa ou espaços extras).
+    """
+    def _text(col: pd.Series) -> pd.Series:
+        return col.fillna('').astype(str).str.replace(r'\s+', ' ', regex=True).str.strip().str.casefold()
+
+    cents = (normalized['amount'].astype(float) * 100).round().astype('int64').astype(str)
+    return (
+        normalized['date'].dt.strftime('%Y-%m-%dT%H:%M:%S') + '|' + cents + '|'
+        + _text(normalized['description']) + '|' + _text(normalized['category_name'])
+    )
+
+
+def add_content_hashes(normalized: pd.DataFrame, occurrences: Optional[Dict[str, int]] = None) -> pd.DataFrame:
+    """
+    Acrescenta a coluna 'content_hash' (SHA-256 de 64 caracteres hex).
+
+    Linhas idênticas dentro do mesmo extrato (ex.: dois cafés iguais no mesmo
+    dia) são legítimas: o hash inclui o número da ocorrência da chave no
+    arquivo, então elas continuam distintas, e reimportar o mesmo extrato
+    gera exatamente os mesmos hashes.
+
+    Args:
+        normalized: DataFrame como retornado por normalize_import_dataframe.
+        occurrences: Contagem por chave já vista em blocos anteriores do mesmo
+            arquivo; é atualizada no lugar (leitura em blocos).
+    """
+    keys = content_keys(normalized)
+    ordinal = keys.groupby(keys, sort=False).cumcount()
+    if occurrences is not None:
+        ordinal = ordinal + keys.map(occurrences).fillna(0).astype('int64')
+        for key, count in keys.value_counts(sort=False).items():
+            occurrences[key] = occurrences.get(key, 0) + int(count)
+
+    hashed = normalized.copy()
+    hashed['content_hash'] = [
+        hashlib.sha256(f"{key}|{n}".encode('utf-8')).hexdigest()
+        for key, n in zip(keys.tolist(), ordinal.tolist())
+    ]
+    return hashed
+
+
+@traced
+def existing_content_hashes(db: Session, hashes: Iterable[str]) -> set:
+    """Hashes (entre os informados) que já existem no banco, buscados em lotes."""
+    unique_hashes = list(set(hashes))
+    found = set()
+    for start in range(0, len(unique_hashes), BULK_INSERT_CHUNK_SIZE):
+        chunk = unique_hashes[start:start + BULK_INSERT_CHUNK_SIZE]
+        found.update(h for (h,) in db.query(Transaction.content_hash).filter(Transaction.content_hash.in_(chunk)))
+    return found
+
+
+def _next_free_content_hash(db: Session, transaction: TransactionCreate) -> str:
+    """Hash de uma transação manual: usa a primeira ocorrência ainda livre."""
+    category = db.get(Category, transaction.category_id)
+    row = pd.DataFrame([{
+        'date': pd.Timestamp(transaction.date),
+        'amount': transaction.amount,
+        'description': transaction.description,
+        'category_name': category.name if category else '',
+    }])
+    key = content_keys(row).iloc[0]
+    ordinal = 0
+    while True:
+        candidates = [hashlib.sha256(f"{key}|{n}".encode('utf-8')).hexdigest() for n in range(ordinal, ordinal + 16)]
+        taken = existing_content_hashes(db, candidates)
+        for candidate in candidates:
+            if candidate not in taken:
+                return candidate
+        ordinal += 16
+
+
 # --- Função Essencial para Análise ---
-def get_transactions_dataframe(db: Session) -> pd.DataFrame:
+@traced
+def get_transactions_dataframe(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    category_ids: Optional[Iterable[int]] = None,
+    min_id: Optional[int] = None,
+    compact: bool = False,
+    include_description: bool = True
+) -> pd.DataFrame:
     """
-    Busca todas as transações (e categorias) e retorna como um DataFrame do Pandas.
+    Busca as transações (e categorias) e retorna como um DataFrame do Pandas.
     Esta é a função chave para a análise no 'analyzer.py'.
+    Os filtros são aplicados no SQL (ver analyzer.analysis_window para a
+    janela que o dashboard precisa).
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        start: Data inicial (inclusiva).
+        end: Data final (exclusiva).
+        category_ids: Restringe a estas categorias.
+        min_id: Se informado, traz apenas transações com id > min_id (leitura incremental).
+        compact: Se True, usa o layout compacto (ver compact_transactions_dataframe).
+        include_description: Se False, não busca a coluna 'description'
+            (a mais pesada), carregada sob demanda só para a tabela de dados brutos.
     """
     # Busca todas as transações e dados de categoria em uma única consulta (JOIN)
     # Importante: A coluna 'amount' deve ser numérica (float) no modelo.
-    query = db.query(
-        Transaction.date, 
-        Transaction.amount, 
-        Transaction.description, 
+    columns = [Transaction.id, Transaction.date, Transaction.amount]
+    if include_description:
+        columns.append(Transaction.description)
+    columns += [
+        Transaction.category_id,
         Category.name.label('category_name') # Renomeia para 'category_name'
-    ).join(Category)
+    ]
+    query = _filter_transactions(db.query(*columns).join(Category), start, end, category_ids)
+
+    if min_id is not None:
+        query = query.filter(Transaction.id > min_id)
     
     # Executa a query e carrega os dados diretamente no DataFrame
-    df = pd.read_sql(query.statement, db.bind)
+    df = read_sql(query.statement, db.bind)
     
     # Garante que a coluna de data seja datetime
     df['date'] = pd.to_datetime(df['date'])
     
-    return df
\ No newline at end of file
+    return compact_transactions_dataframe(df) if compact else df
+
+
+def iter_transactions_dataframes(
+    db: Session,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None,
+    chunk_size: int = STREAM_CHUNK_SIZE
+) -> Iterator[pd.DataFrame]:
+    """
+    Lê as transações em blocos de `chunk_size` linhas, sem materializar a
+    tabela inteira (para históricos muito grandes; ver
+    analyzer.build_monthly_totals_from_chunks).
+
+    Usa cursor do lado do servidor quando o driver suporta (stream_results);
+    nos demais, o driver entrega as linhas sob demanda a cada fetch.
+
+    Yields:
+        DataFrames com 'id', 'date', 'amount', 'category_id' e 'category_name'.
+    """
+    query = _filter_transactions(
+        db.query(
+            Transaction.id, Transaction.date, Transaction.amount,
+            Transaction.category_id, Category.name.label('category_name'),
+        ).join(Category),
+        start, end,
+    )
+    conn = db.connection().execution_options(stream_results=True, max_row_buffer=chunk_size)
+    for chunk in read_sql(query.statement, conn, chunksize=chunk_size):
+        chunk['date'] = pd.to_datetime(chunk['date'])
+        yield chunk
+
+
+@traced
+def get_transactions_page(
+    db: Session,
+    start: Optional[datetime] = None,
+    before: Optional[Tuple[datetime, int]] = None,
+    limit: int = 50
+) -> pd.DataFrame:
+    """
+    Uma página das transações mais recentes, ordenada no banco
+    (ORDER BY date DESC, id DESC) e paginada por keyset.
+
+    Em vez de OFFSET (que lê e descarta todas as linhas anteriores), a página
+    seguinte começa logo após a última linha da atual, usando o índice de data.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        start: Data inicial (inclusiva).
+        before: Cursor (date, id) da última linha da página anterior.
+        limit: Linhas por página.
+
+    Returns:
+        DataFrame com 'id', 'date', 'amount', 'description' e 'category_name'.
+    """
+    query = _filter_transactions(
+        db.query(
+            Transaction.id, Transaction.date, Transaction.amount,
+            Transaction.description, Category.name.label('category_name'),
+        ).join(Category),
+        start,
+    )
+    if before is not None:
+        before_date, before_id = before
+        query = query.filter(or_(
+            Transaction.date < before_date,
+            and_(Transaction.date == before_date, Transaction.id < before_id),
+        ))
+
+    query = query.order_by(Transaction.date.desc(), Transaction.id.desc()).limit(limit)
+    df = read_sql(query.statement, db.bind)
+    df['date'] = pd.to_datetime(df['date'])
+    return df
+
+
+def compact_transactions_dataframe(df: pd.DataFrame) -> pd.DataFrame:
+    """
+    Converte o DataFrame de transações para um layout compacto em memória:
+
+    - 'amount' (float64) vira 'amount_cents' (int64, centavos exatos);
+    - 'category_name' e 'description' viram Categorical (cada texto
+      distinto é guardado uma única vez, as linhas guardam só códigos);
+    - 'category_id' vira int32 e 'id' int64.
+
+    Os tipos são fixos mesmo sem linhas (read_sql devolve 'object' para
+    colunas vazias), para que o cache possa anexar deltas a um resultado vazio.
+    As funções do 'analyzer.py' aceitam os dois layouts.
+    """
+    compact = df.drop(columns='amount')
+    compact['id'] = compact['id'].astype('int64')
+    compact.insert(
+        compact.columns.get_loc('date') + 1,
+        'amount_cents',
+        (df['amount'] * 100).round().astype('int64'),
+    )
+    compact['category_id'] = compact['category_id'].astype('int32')
+    # astype(str) antes: sem linhas, as categorias ficariam com dtype 'object'
+    compact['category_name'] = compact['category_name'].astype(str).astype('category')
+    if 'description' in compact:
+        compact['description'] = compact['description'].astype(str).astype('category')
+    return compact
+
+
+def _filter_transactions(query, start=None, end=None, category_ids=None):
+    """Aplica os filtros de data e categoria (usam os índices de data e categoria + data)."""
+    if start is not None:
+        query = query.filter(Transaction.date >= start)
+    if end is not None:
+        query = query.filter(Transaction.date < end)
+    if category_ids is not None:
+        query = query.filter(Transaction.category_id.in_(list(category_ids)))
+    return query
+
+
+@traced
+def get_transactions_version(
+    db: Session,
+    max_id: Optional[int] = None,
+    start: Optional[datetime] = None,
+    end: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Versão barata da tabela de transações (contagem + somas de verificação).
+
+    Usada pelo cache incremental para detectar exclusões ou alterações
+    em linhas já carregadas, sem reler a tabela inteira. Detecta inserções,
+    exclusões e alterações de valor, de data (dia) e de categoria, inclusive
+    categorias trocadas entre duas linhas ('category_id_sum' pondera pelo id).
+    Não detecta valores trocados entre linhas nem mudanças só no horário.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        max_id: Se informado, considera apenas as transações com id <= max_id.
+        start, end: Mesma janela de datas usada em get_transactions_dataframe.
+
+    Returns:
+        Dicionário com 'count', 'max_id', 'amount_sum', 'category_sum',
+        'category_id_sum' e 'date_sum'.
+    """
+    # Somas em BIGINT: em SQL Server, SUM de INT estoura acima de 2^31
+    category_id = cast(Transaction.category_id, BigInteger)
+    day_number = (
+        cast(extract('year', Transaction.date), BigInteger) * 372
+        + cast(extract('month', Transaction.date), BigInteger) * 31
+        + cast(extract('day', Transaction.date), BigInteger)
+    )
+    query = db.query(
+        func.count(Transaction.id),
+        func.max(Transaction.id),
+        func.sum(Transaction.amount),
+        func.sum(category_id),
+        func.sum(cast(Transaction.id, BigInteger) * category_id),
+        func.sum(day_number),
+    )
+    query = _filter_transactions(query, start, end)
+    if max_id is not None:
+        query = query.filter(Transaction.id <= max_id)
+
+    count, last_id, amount_sum, category_sum, category_id_sum, date_sum = query.one()
+    return {
+        "count": int(count or 0),
+        "max_id": int(last_id or 0),
+        "amount_sum": float(amount_sum or 0.0),
+        "category_sum": int(category_sum or 0),
+        "category_id_sum": int(category_id_sum or 0),
+        "date_sum": int(date_sum or 0),
+    }
+
+
+# --- Totais Mensais Agregados (tabela 'monthly_category_totals') ---
+@traced
+def apply_monthly_totals(db: Session, transactions_df: pd.DataFrame) -> None:
+    """
+    Soma novas transações aos totais mensais por categoria, sem fazer commit.
+
+    Os incrementos são feitos no banco (UPDATE ... SET income = income + :delta),
+    então escritores concorrentes (workers de importação, vários usuários) não
+    perdem atualizações. Chaves novas são inseridas; se outro escritor inserir
+    a mesma chave antes, a inserção vira incremento.
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        transactions_df: DataFrame com colunas 'date', 'amount' e 'category_id'.
+    """
+    if transactions_df.empty:
+        return
+
+    df = transactions_df.assign(date=pd.to_datetime(transactions_df['date']))
+    deltas = analyzer.build_monthly_totals(df, key='category_id')
+
+    rows = [
+        {
+            'year': int(delta.year), 'month': int(delta.month), 'category_id': int(delta.category_id),
+            'income': float(delta.income), 'expense': float(delta.expense),
+            'income_count': int(delta.income_count), 'expense_count': int(delta.expense_count),
+        }
+        for delta in deltas.itertuples(index=False)
+    ]
+
+    # Chaves já existentes na faixa de anos/categorias afetada (uma consulta)
+    existing = set(db.execute(
+        select(MonthlyCategoryTotal.year, MonthlyCategoryTotal.month, MonthlyCategoryTotal.category_id).where(
+            MonthlyCategoryTotal.year.between(int(deltas['year'].min()), int(deltas['year'].max())),
+            MonthlyCategoryTotal.category_id.in_(deltas['category_id'].unique().tolist()),
+        )
+    ).tuples())
+    to_update = [row for row in rows if (row['year'], row['month'], row['category_id']) in existing]
+    to_insert = [row for row in rows if (row['year'], row['month'], row['category_id']) not in existing]
+
+    if to_update:
+        _increment_monthly_totals(db, to_update)
+    if to_insert:
+        try:
+            with db.begin_nested():
+                db.execute(insert(MonthlyCategoryTotal.__table__), to_insert)
+        except IntegrityError:
+            # Outro escritor criou alguma das chaves: insere uma a uma, incrementando as que já existem
+            for row in to_insert:
+                try:
+                    with db.begin_nested():
+                        db.execute(insert(MonthlyCategoryTotal.__table__), [row])
+                except IntegrityError:
+                    _increment_monthly_totals(db, [row])
+
+
+def _increment_monthly_totals(db: Session, rows: List[Dict[str, Any]]) -> None:
+    """Soma os deltas às linhas existentes com um UPDATE atômico por chave (executemany)."""
+    table = MonthlyCategoryTotal.__table__
+    statement = (
+        update(table)
+        .where(
+            table.c.year == bindparam('key_year'),
+            table.c.month == bindparam('key_month'),
+            table.c.category_id == bindparam('key_category_id'),
+        )
+        .values(
+            income=table.c.income + bindparam('delta_income'),
+            expense=table.c.expense + bindparam('delta_expense'),
+            income_count=table.c.income_count + bindparam('delta_income_count'),
+            expense_count=table.c.expense_count + bindparam('delta_expense_count'),
+        )
+    )
+    db.execute(statement, [
+        {
+            'key_year': row['year'], 'key_month': row['month'], 'key_category_id': row['category_id'],
+            'delta_income': row['income'], 'delta_expense': row['expense'],
+            'delta_income_count': row['income_count'], 'delta_expense_count': row['expense_count'],
+        }
+        for row in rows
+    ])
+
+
+@traced
+def rebuild_monthly_totals(db: Session) -> int:
+    """
+    Recria a tabela 'monthly_category_totals' a partir de 'transactions'
+    com um único INSERT ... SELECT ... GROUP BY.
+
+    Returns:
+        Número de linhas (mês x categoria) geradas.
+    """
+    year = cast(extract('year', Transaction.date), Integer)
+    month = cast(extract('month', Transaction.date), Integer)
+    amount = Transaction.amount
+
+    grouped = select(
+        year,
+        month,
+        Transaction.category_id,
+        func.sum(case((amount > 0, amount), else_=0)),
+        func.sum(case((amount < 0, -amount), else_=0)),
+        func.sum(case((amount > 0, 1), else_=0)),
+        func.sum(case((amount < 0, 1), else_=0)),
+    ).group_by(year, month, Transaction.category_id)
+
+    try:
+        db.execute(delete(MonthlyCategoryTotal))
+        db.execute(
+            insert(MonthlyCategoryTotal).from_select(
+                ['year', 'month', 'category_id', 'income', 'expense', 'income_count', 'expense_count'],
+                grouped,
+            )
+        )
+        db.commit()
+    except Exception:
+        db.rollback()
+        raise
+
+    return db.query(MonthlyCategoryTotal).count()
+
+
+@traced
+def get_monthly_totals_dataframe(db: Session) -> pd.DataFrame:
+    """
+    Retorna os totais mensais por categoria como DataFrame.
+    Entrada para as funções '*_from_totals' do 'analyzer.py'.
+    """
+    query = db.query(
+        MonthlyCategoryTotal.year,
+        MonthlyCategoryTotal.month,
+        Category.name.label('category_name'),
+        MonthlyCategoryTotal.income,
+        MonthlyCategoryTotal.expense,
+        MonthlyCategoryTotal.income_count,
+        MonthlyCategoryTotal.expense_count,
+    ).join(Category)
+
+    return read_sql(query.statement, db.bind)
+
+
+@traced
+def get_dashboard_summary(
+    db: Session,
+    backend: Optional[str] = None,
+    months_to_compare: int = 3,
+    reference_date: Optional[datetime] = None
+) -> Dict[str, Any]:
+    """
+    Calcula o resumo do dashboard (ver analyzer.summarize_totals).
+
+    Args:
+        db: Sessão ativa do banco de dados (SQLAlchemy).
+        backend: 'pandas' (tabela agregada) ou 'sql' (GROUP BY no banco).
+            Se omitido, usa a variável de ambiente ANALYZER_BACKEND.
+        months_to_compare: Número de meses para a média histórica.
+        reference_date: Data do "mês atual" (padrão: hoje).
+
+    Returns:
+        O resumo. Com o backend 'pandas', lê só a tabela de totais (meses x
+        categorias), sem percorrer a tabela de transações.
+    """
+    backend = (backend or analyzer.ANALYZER_BACKEND).lower()
+    if backend not in analyzer.ANALYZER_BACKENDS:
+        raise ValueError(f"Backend de análise desconhecido: {backend}. Use um de {analyzer.ANALYZER_BACKENDS}.")
+
+    if backend == 'sql':
+        return analyzer_sql.summarize(db, months_to_compare, reference_date)
+    return analyzer.summarize_totals(get_monthly_totals_dataframe(db), months_to_compare, reference_date)
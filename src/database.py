@@ -1,7 +1,15 @@
 import os
+import threading
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, Optional
+
 from dotenv import load_dotenv
 from sqlalchemy import create_engine
-from sqlalchemy.orm import sessionmaker
+from sqlalchemy.engine import Engine, make_url
+from sqlalchemy.orm import Session, sessionmaker
+from sqlalchemy.pool import QueuePool
+
+from src import instrumentation
 
 """
 Carrega as variáveis de ambiente do arquivo .env
@@ -32,26 +40,120 @@ if not DB_CONNECTION_STRING:
     )
 
 
-# Cria o Motor de Conexão
-# O 'pool_pre_ping=True' ajuda a gerenciar conexões em nuvem de longa duração.
-# O connect_args é adicionado para aumentar a estabilidade.
-engine = create_engine(
-    DB_CONNECTION_STRING, 
-    pool_pre_ping=True,
-    # Adiciona argumentos de conexão específicos para o Azure SQL
-    connect_args={
-        "timeout": 30,  # Tempo limite de conexão
-    }
-)
-
-# Cria a Sessão Local
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
-
-# Função de Conveniência (para obter a sessão no Streamlit)
-def get_db():
-    db = SessionLocal()
+# --- Pool de Conexões ---
+# Conexões mantidas abertas por processo e extras permitidas em picos de uso
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Espera máxima (s) por uma conexão livre antes de erro
+DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", "30"))
+# Conexões mais velhas que isso (s) são descartadas e reabertas na próxima
+# retirada. Fica abaixo do tempo em que o Azure SQL e proxies/NAT encerram
+# conexões ociosas, substituindo o pre-ping (um SELECT a cada retirada).
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+# Pre-ping opcional, para redes em que conexões caem antes do recycle
+DB_POOL_PRE_PING = os.getenv("DB_POOL_PRE_PING", "0").strip().lower() in ("1", "true", "yes")
+
+# Tempo limite de conexão (s); cada driver usa um nome de parâmetro diferente
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "30"))
+_CONNECT_TIMEOUT_ARG = {"mssql": "timeout", "sqlite": "timeout", "postgresql": "connect_timeout"}
+
+
+def _engine_options(url: str) -> dict:
+    """Parâmetros do create_engine conforme o banco (SQL Server, PostgreSQL ou SQLite)."""
+    parsed = make_url(url)
+    backend = parsed.get_backend_name()
+    options = {"pool_pre_ping": DB_POOL_PRE_PING, "pool_recycle": DB_POOL_RECYCLE}
+    if backend in _CONNECT_TIMEOUT_ARG:
+        options["connect_args"] = {_CONNECT_TIMEOUT_ARG[backend]: DB_CONNECT_TIMEOUT}
+    if backend == "sqlite" and parsed.database in (None, "", ":memory:"):
+        return options  # Banco em memória: pool de conexão única, sem dimensionamento
+    options.update(
+        pool_size=DB_POOL_SIZE,
+        max_overflow=DB_MAX_OVERFLOW,
+        pool_timeout=DB_POOL_TIMEOUT,
+        # LIFO: reutiliza as conexões mais recentes; as ociosas envelhecem e são recicladas
+        pool_use_lifo=True,
+    )
+    if backend == "mssql" and parsed.get_driver_name() == "pyodbc":
+        # executemany em lote no pyodbc (um envio por bloco em vez de um por linha);
+        # só esse driver aceita o parâmetro
+        options["fast_executemany"] = True
+    return options
+
+
+# --- Engine e Sessões (criados sob demanda) ---
+# O engine só é criado no primeiro uso: importar este módulo (ex.: a CLI com
+# --help, ou módulos que só precisam dos modelos) não carrega o driver nem
+# abre conexões.
+_engine: Optional[Engine] = None
+_session_factory: Optional[sessionmaker] = None
+_init_lock = threading.Lock()
+
+
+def get_engine() -> Engine:
+    """Engine do processo, criado na primeira chamada."""
+    global _engine
+    if _engine is None:
+        with _init_lock:
+            if _engine is None:
+                engine = create_engine(DB_CONNECTION_STRING, **_engine_options(DB_CONNECTION_STRING))
+                # Consultas, linhas e latência por rerun (só com INSTRUMENTATION_ENABLED=1)
+                instrumentation.instrument_engine(engine)
+                _engine = engine
+    return _engine
+
+
+def get_session_factory() -> sessionmaker:
+    """Fábrica de sessões ligada ao engine do processo."""
+    global _session_factory
+    if _session_factory is None:
+        _session_factory = sessionmaker(autocommit=False, autoflush=False, bind=get_engine())
+    return _session_factory
+
+
+def __getattr__(name: str):
+    # Compatibilidade: 'database.engine' e 'database.SessionLocal' continuam
+    # funcionando, mas só criam o engine quando acessados
+    if name == "engine":
+        return get_engine()
+    if name == "SessionLocal":
+        return get_session_factory()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+@contextmanager
+def session_scope() -> Iterator[Session]:
+    """
+    Sessão com ciclo de vida delimitado (ex.: um rerun do Streamlit ou um
+    comando da CLI). As funções do 'crud' fazem seus próprios commits; em
+    caso de exceção, o que estiver pendente é desfeito. Ao sair, a sessão é
+    fechada e a conexão volta ao pool.
+    """
+    db = get_session_factory()()
     try:
-        return db
+        yield db
+    except BaseException:
+        db.rollback()
+        raise
     finally:
-        # Garante que a sessão é fechada após o uso, liberando recursos
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+def get_db() -> Session:
+    """Sessão avulsa: quem chama deve fechá-la (prefira session_scope)."""
+    return get_session_factory()()
+
+
+def pool_status() -> Dict[str, Any]:
+    """Uso do pool de conexões, para o painel de diagnóstico."""
+    pool = get_engine().pool
+    status: Dict[str, Any] = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            size=pool.size(),
+            checked_out=pool.checkedout(),
+            checked_in=pool.checkedin(),
+            overflow=max(pool.overflow(), 0),
+            max_overflow=DB_MAX_OVERFLOW,
+        )
+    return status
@@ -0,0 +1,334 @@
+"""
+Importação de CSV em segundo plano (jobs com progresso e retomada).
+
+O arquivo enviado é salvo em disco e processado por um pool de threads, fora
+da execução do script do Streamlit. A leitura é feita em blocos
+(read_csv(chunksize=...)); cada bloco é gravado em uma transação junto com o
+checkpoint do job ('chunks_done'). Se o processo cair ou um bloco falhar, a
+importação é retomada a partir do último bloco confirmado.
+
+Vários arquivos de uma vez (upload múltiplo ou um diretório) são lidos e
+normalizados em paralelo por um pool de processos; o resultado alimenta um
+único gravador em lote, que resolve as categorias uma só vez para todos.
+"""
+import glob
+import multiprocessing
+import os
+import shutil
+import tempfile
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import or_, update
+from sqlalchemy.orm import Session
+
+from src import crud, database
+from src.models import ImportJob
+
+# Diretório onde os CSVs enviados ficam até o fim da importação
+IMPORT_DIR = os.getenv("IMPORT_DIR", os.path.join(tempfile.gettempdir(), "financas_imports"))
+
+# Linhas do CSV por bloco (cada bloco = uma transação no banco + checkpoint)
+IMPORT_CHUNK_SIZE = int(os.getenv("IMPORT_CHUNK_SIZE", "5000"))
+
+# Número de importações simultâneas por processo
+IMPORT_WORKERS = int(os.getenv("IMPORT_WORKERS", "2"))
+
+# Processos usados para ler/normalizar vários CSVs (padrão: número de CPUs)
+IMPORT_PARSE_PROCESSES = int(os.getenv("IMPORT_PARSE_PROCESSES", "0")) or None
+
+# Um job 'running' sem batimento há mais que isso é considerado abandonado
+STALE_JOB_AFTER = timedelta(minutes=5)
+
+_executor = ThreadPoolExecutor(max_workers=IMPORT_WORKERS, thread_name_prefix="csv-import")
+
+
+# --- Criação e consulta de jobs ---
+def save_upload(filename: str, data: bytes) -> str:
+    """Salva o arquivo enviado em IMPORT_DIR e retorna o caminho."""
+    os.makedirs(IMPORT_DIR, exist_ok=True)
+    path = os.path.join(IMPORT_DIR, f"{uuid.uuid4().hex}_{os.path.basename(filename)}")
+    with open(path, "wb") as f:
+        f.write(data)
+    return path
+
+
+def save_batch_upload(files: Iterable[Tuple[str, bytes]]) -> str:
+    """Salva vários arquivos em um subdiretório próprio e retorna o diretório."""
+    batch_dir = os.path.join(IMPORT_DIR, f"batch_{uuid.uuid4().hex}")
+    os.makedirs(batch_dir)
+    for index, (filename, data) in enumerate(files):
+        # O prefixo numérico preserva a ordem de envio (e a ordem dos blocos ao retomar)
+        with open(os.path.join(batch_dir, f"{index:04d}_{os.path.basename(filename)}"), "wb") as f:
+            f.write(data)
+    return batch_dir
+
+
+def create_import_job(db: Session, filename: str, file_path: str, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportJob:
+    """Registra um novo job de importação (status 'pending')."""
+    job = ImportJob(filename=filename, file_path=file_path, status="pending", chunk_size=chunk_size)
+    db.add(job)
+    db.commit()
+    db.refresh(job)
+    return job
+
+
+def get_import_job(db: Session, job_id: int) -> Optional[ImportJob]:
+    """Busca um job pelo id."""
+    return db.get(ImportJob, job_id)
+
+
+def list_import_jobs(db: Session, limit: int = 20) -> List[ImportJob]:
+    """Jobs mais recentes primeiro."""
+    return db.query(ImportJob).order_by(ImportJob.id.desc()).limit(limit).all()
+
+
+def job_progress(job: ImportJob) -> Dict[str, Any]:
+    """
+    Resumo de progresso do job para exibição.
+
+    Returns:
+        Dicionário com 'status', 'rows_done', 'rows_skipped' (já existentes),
+        'total_rows', 'fraction' (0..1) e 'rows_per_sec' (da execução atual).
+    """
+    fraction = 0.0
+    if job.total_rows:
+        fraction = min(job.rows_done / job.total_rows, 1.0)
+    elif job.status == "done":
+        fraction = 1.0
+
+    rows_per_sec = 0.0
+    if job.started_at and job.updated_at:
+        elapsed = (job.updated_at - job.started_at).total_seconds()
+        if elapsed > 0:
+            rows_per_sec = (job.rows_done - job.start_rows) / elapsed
+
+    return {
+        "status": job.status,
+        "rows_done": job.rows_done,
+        "rows_skipped": job.rows_skipped,
+        "total_rows": job.total_rows,
+        "fraction": fraction,
+        "rows_per_sec": rows_per_sec,
+        "error": job.error,
+    }
+
+
+# --- Execução ---
+def submit_import_job(job_id: int, session_factory: Callable[[], Session] = None) -> Future:
+    """Agenda o job no pool de threads e retorna imediatamente."""
+    return _executor.submit(run_import_job, job_id, session_factory)
+
+
+def start_import(db: Session, filename: str, data: bytes, chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportJob:
+    """Salva o arquivo, cria o job e o agenda em segundo plano."""
+    job = create_import_job(db, filename, save_upload(filename, data), chunk_size)
+    submit_import_job(job.id)
+    return job
+
+
+def start_batch_import(db: Session, files: List[Tuple[str, bytes]], chunk_size: int = IMPORT_CHUNK_SIZE) -> ImportJob:
+    """Como start_import, para vários arquivos (lidos em paralelo pelo job)."""
+    job = create_import_job(db, f"{len(files)} arquivos", save_batch_upload(files), chunk_size)
+    submit_import_job(job.id)
+    return job
+
+
+def resume_import_job(db: Session, job_id: int) -> None:
+    """Recoloca um job que falhou na fila; ele continua do último bloco confirmado."""
+    db.execute(
+        update(ImportJob)
+        .where(ImportJob.id == job_id, ImportJob.status == "failed")
+        .values(status="pending", error=None)
+    )
+    db.commit()
+    submit_import_job(job_id)
+
+
+def resume_interrupted_jobs(db: Session) -> List[int]:
+    """
+    Reagenda os jobs pendentes ou abandonados (ex.: o container reiniciou no
+    meio da importação). Chamar uma vez na inicialização do processo.
+    """
+    stale_before = datetime.utcnow() - STALE_JOB_AFTER
+    job_ids = [
+        job_id for (job_id,) in db.query(ImportJob.id).filter(
+            or_(
+                ImportJob.status == "pending",
+                (ImportJob.status == "running") & (ImportJob.updated_at < stale_before),
+            )
+        )
+    ]
+    for job_id in job_ids:
+        submit_import_job(job_id)
+    return job_ids
+
+
+def _claim_job(db: Session, job_id: int) -> bool:
+    """
+    Marca o job como 'running' de forma atômica (UPDATE condicional), para que
+    dois workers (ou processos) nunca processem o mesmo job.
+    """
+    now = datetime.utcnow()
+    result = db.execute(
+        update(ImportJob)
+        .where(
+            ImportJob.id == job_id,
+            or_(
+                ImportJob.status == "pending",
+                (ImportJob.status == "running") & (ImportJob.updated_at < now - STALE_JOB_AFTER),
+            ),
+        )
+        .values(status="running", started_at=now, updated_at=now, start_rows=ImportJob.rows_done)
+    )
+    db.commit()
+    return result.rowcount == 1
+
+
+def _count_rows(file_path: str, chunk_size: int) -> int:
+    """Conta as linhas de dados do CSV (lendo só a primeira coluna)."""
+    return sum(len(chunk) for chunk in pd.read_csv(file_path, usecols=[0], chunksize=chunk_size))
+
+
+def _checkpoint(job: ImportJob, chunk_index: int, rows: int, result: Dict[str, int]) -> None:
+    """Atualiza o checkpoint do job (o commit é feito junto com o bloco gravado)."""
+    job.chunks_done = chunk_index + 1
+    job.rows_done += rows
+    job.rows_skipped += result["skipped"]
+    job.new_categories += result["new_categories"]
+    job.updated_at = datetime.utcnow()
+
+
+def _run_file_job(db: Session, job: ImportJob) -> None:
+    """Importa um único CSV, bloco a bloco."""
+    if job.total_rows is None:
+        job.total_rows = _count_rows(job.file_path, job.chunk_size)
+        db.commit()
+
+    # Ocorrências das chaves de conteúdo nos blocos anteriores (ver crud.add_content_hashes)
+    occurrences: Dict[str, int] = {}
+    reader = pd.read_csv(job.file_path, chunksize=job.chunk_size)
+    for index, chunk in enumerate(reader):
+        normalized = crud.add_content_hashes(crud.normalize_import_dataframe(chunk), occurrences)
+        if index < job.chunks_done:
+            continue  # Bloco já confirmado em uma execução anterior
+
+        # Bloco + checkpoint na mesma transação: ou os dois ficam, ou nenhum
+        result = crud.bulk_insert_transactions(db, normalized, commit=False)
+        _checkpoint(job, index, len(chunk), result)
+        db.commit()
+
+
+def _run_batch_job(db: Session, job: ImportJob) -> None:
+    """Importa um diretório de CSVs: leitura paralela e um único gravador."""
+    normalized = parse_files(list_csv_files(job.file_path))
+    if job.total_rows is None:
+        job.total_rows = len(normalized)
+
+    # Categorias de todos os arquivos resolvidas uma única vez
+    category_ids, new_categories = crud.get_or_create_categories(db, normalized['category_name'])
+    job.new_categories += new_categories
+    db.commit()
+
+    for index, start in enumerate(range(0, len(normalized), job.chunk_size)):
+        if index < job.chunks_done:
+            continue
+
+        chunk = normalized.iloc[start:start + job.chunk_size]
+        result = crud.bulk_insert_transactions(db, chunk, commit=False, category_ids=category_ids)
+        _checkpoint(job, index, len(chunk), result)
+        db.commit()
+
+
+def run_import_job(job_id: int, session_factory: Callable[[], Session] = None) -> Optional[str]:
+    """
+    Executa (ou retoma) um job de importação. Roda na thread do worker,
+    com sessão própria do banco.
+
+    Returns:
+        Status final do job ('done' ou 'failed'), ou None se outro worker já o processa.
+    """
+    db = (session_factory or database.get_session_factory())()
+    try:
+        if not _claim_job(db, job_id):
+            return None  # Já concluído ou em execução em outro worker
+
+        job = db.get(ImportJob, job_id)
+        try:
+            if os.path.isdir(job.file_path):
+                _run_batch_job(db, job)
+            else:
+                _run_file_job(db, job)
+
+            job.status = "done"
+            job.finished_at = job.updated_at = datetime.utcnow()
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            job.status = "failed"
+            job.error = str(e)[:1024]
+            job.updated_at = datetime.utcnow()
+            db.commit()
+            return job.status
+
+        if os.path.isdir(job.file_path):
+            shutil.rmtree(job.file_path, ignore_errors=True)
+        elif os.path.exists(job.file_path):
+            os.remove(job.file_path)
+        return job.status
+    finally:
+        db.close()
+
+
+# --- Importação de vários arquivos (pool de processos) ---
+def list_csv_files(directory: str) -> List[str]:
+    """CSVs de um diretório, em ordem de nome."""
+    return sorted(glob.glob(os.path.join(directory, "*.csv")))
+
+
+def parse_csv_file(path: str) -> pd.DataFrame:
+    """Lê, normaliza e calcula os hashes de conteúdo de um CSV (roda em um processo do pool)."""
+    return crud.add_content_hashes(crud.normalize_import_dataframe(pd.read_csv(path)))
+
+
+def parse_files(paths: List[str], max_workers: Optional[int] = IMPORT_PARSE_PROCESSES) -> pd.DataFrame:
+    """
+    Lê e normaliza vários CSVs em paralelo, um processo por arquivo.
+
+    Returns:
+        Um único DataFrame normalizado, na ordem de `paths`.
+    """
+    if not paths:
+        raise ValueError("Nenhum arquivo CSV para importar.")
+
+    if len(paths) == 1 or max_workers == 1:
+        frames = [parse_csv_file(path) for path in paths]
+    else:
+        # 'spawn' evita herdar, via fork, as threads do servidor do Streamlit
+        with ProcessPoolExecutor(
+            max_workers=min(len(paths), max_workers or os.cpu_count() or 1),
+            mp_context=multiprocessing.get_context("spawn"),
+        ) as pool:
+            frames = list(pool.map(parse_csv_file, paths))
+
+    return pd.concat(frames, ignore_index=True)
+
+
+def import_files(db: Session, paths: List[str], max_workers: Optional[int] = IMPORT_PARSE_PROCESSES) -> Dict[str, int]:
+    """
+    Importa vários CSVs de forma síncrona (sem job): leitura paralela e
+    gravação em lote numa única transação.
+
+    Returns:
+        Dicionário com 'files', 'transactions', 'skipped' e 'new_categories'.
+    """
+    result = crud.bulk_insert_transactions(db, parse_files(paths, max_workers))
+    return {"files": len(paths), **result}
+
+
+def import_directory(db: Session, directory: str, max_workers: Optional[int] = IMPORT_PARSE_PROCESSES) -> Dict[str, int]:
+    """Importa todos os CSVs de um diretório (ver import_files)."""
+    return import_files(db, list_csv_files(directory), max_workers)
@@ -0,0 +1,250 @@
+"""
+Instrumentação do caminho quente: spans de tempo, consultas SQL e caches.
+
+Ativada pela variável de ambiente INSTRUMENTATION_ENABLED=1. Desativada (o
+padrão), o decorador `traced` devolve a própria função e `span` não mede
+nada, e nenhum evento é registrado no engine: o custo é praticamente zero.
+
+Ativada, cada função decorada (crud, analyzer, charts) e cada consulta SQL
+(eventos do SQLAlchemy) são somadas em dois lugares:
+
+- no relatório do rerun atual (ver `collect`), exibido no painel de
+  diagnóstico do Streamlit e gravado como uma linha JSON no log
+  'financas.instrumentation';
+- nas métricas acumuladas do processo (ver `metrics_snapshot`), exportadas
+  pelo botão do painel de diagnóstico e gravadas no log ao fim de cada
+  comando da CLI.
+
+As linhas lidas do banco ('rows_fetched') são contadas nas leituras para
+DataFrame (ver `read_sql`): o rowcount do cursor só informa linhas afetadas
+por INSERT/UPDATE/DELETE ('rows_affected'); em SELECT o pyodbc e o sqlite3
+retornam -1.
+"""
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, Optional
+
+ENABLED = os.getenv("INSTRUMENTATION_ENABLED", "0").strip().lower() in ("1", "true", "yes")
+
+logger = logging.getLogger("financas.instrumentation")
+if not logger.handlers:
+    # Sem configuração de logging (ex.: Streamlit no App Service), as linhas
+    # JSON vão para o stderr, que é coletado pelos logs do container (e não
+    # se mistura ao JSON que a CLI escreve no stdout)
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+
+
+class Report:
+    """Tempos somados por span e estatísticas das consultas SQL."""
+
+    def __init__(self, label: str = ""):
+        self.label = label
+        self.spans: Dict[str, Dict[str, float]] = {}
+        self.queries = {
+            "count": 0, "seconds": 0.0, "rows_fetched": 0, "rows_affected": 0,
+            "slowest_seconds": 0.0, "slowest": "",
+        }
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def add_span(self, name: str, seconds: float, rows: Optional[int] = None) -> None:
+        stats = self.spans.setdefault(name, {"count": 0, "seconds": 0.0, "max_seconds": 0.0, "rows": 0})
+        stats["count"] += 1
+        stats["seconds"] += seconds
+        stats["max_seconds"] = max(stats["max_seconds"], seconds)
+        if rows is not None:
+            stats["rows"] += rows
+
+    def add_query(self, statement: str, seconds: float, rows: int) -> None:
+        self.queries["count"] += 1
+        self.queries["seconds"] += seconds
+        self.queries["rows_affected"] += max(rows, 0)
+        if seconds > self.queries["slowest_seconds"]:
+            self.queries["slowest_seconds"] = seconds
+            self.queries["slowest"] = " ".join(statement.split())[:300]
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {"label": self.label, "elapsed": self.elapsed, "spans": self.spans, "queries": self.queries}
+
+
+# Relatório do rerun em andamento (por thread/contexto) e totais do processo
+_current: contextvars.ContextVar[Optional[Report]] = contextvars.ContextVar("instrumentation_report", default=None)
+_process = Report("process")
+_process_lock = threading.Lock()
+
+
+def _record_span(name: str, seconds: float, rows: Optional[int]) -> None:
+    report = _current.get()
+    if report is not None:
+        report.add_span(name, seconds, rows)
+    with _process_lock:
+        _process.add_span(name, seconds, rows)
+
+
+def _record_query(statement: str, seconds: float, rows: int) -> None:
+    report = _current.get()
+    if report is not None:
+        report.add_query(statement, seconds, rows)
+    with _process_lock:
+        _process.add_query(statement, seconds, rows)
+
+
+def _record_fetch(rows: int) -> None:
+    report = _current.get()
+    if report is not None:
+        report.queries["rows_fetched"] += rows
+    with _process_lock:
+        _process.queries["rows_fetched"] += rows
+
+
+def read_sql(sql: Any, con: Any, **kwargs: Any) -> Any:
+    """
+    pandas.read_sql contando as linhas lidas do banco (também com chunksize,
+    bloco a bloco). Com a instrumentação desativada, é o próprio read_sql.
+    """
+    import pandas as pd
+
+    result = pd.read_sql(sql, con, **kwargs)
+    if not ENABLED:
+        return result
+    if kwargs.get("chunksize"):
+        return _counting_chunks(result)
+    _record_fetch(len(result))
+    return result
+
+
+def _counting_chunks(chunks: Iterator[Any]) -> Iterator[Any]:
+    for chunk in chunks:
+        _record_fetch(len(chunk))
+        yield chunk
+
+
+def _rows_of(result: Any) -> Optional[int]:
+    """Linhas de um resultado tabular (DataFrame), para estimar o volume lido."""
+    return len(result) if hasattr(result, "columns") and hasattr(result, "__len__") else None
+
+
+def traced(func: Callable = None, *, name: Optional[str] = None) -> Callable:
+    """
+    Decorador que mede o tempo de cada chamada (span 'módulo.função').
+    Com a instrumentação desativada, retorna a função sem alteração.
+    """
+    if func is None:
+        return functools.partial(traced, name=name)
+    if not ENABLED:
+        return func
+
+    span_name = name or f"{func.__module__.rsplit('.', 1)[-1]}.{func.__qualname__}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        start = time.perf_counter()
+        result = func(*args, **kwargs)
+        _record_span(span_name, time.perf_counter() - start, _rows_of(result))
+        return result
+
+    return wrapper
+
+
+@contextmanager
+def span(name: str) -> Iterator[None]:
+    """Mede um trecho de código (ex.: renderização de um gráfico)."""
+    if not ENABLED:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _record_span(name, time.perf_counter() - start, None)
+
+
+@contextmanager
+def collect(label: str = "rerun") -> Iterator[Report]:
+    """
+    Agrupa os spans e consultas de um trecho (ex.: um rerun do Streamlit)
+    em um relatório, gravado no log como JSON ao final.
+    """
+    report = Report(label)
+    if not ENABLED:
+        yield report
+        return
+
+    token = _current.set(report)
+    try:
+        yield report
+    finally:
+        _current.reset(token)
+        report.elapsed = time.perf_counter() - report.started
+        logger.info(json.dumps(report.as_dict(), ensure_ascii=False))
+
+
+# Inicialização a frio: importações do app e tempo até a primeira página completa
+_startup: Dict[str, Any] = {}
+
+
+def startup_begin(script_started: float, imports_seconds: float) -> None:
+    """Registra o início do primeiro rerun do processo (chamadas seguintes são ignoradas)."""
+    _startup.setdefault("script_started", script_started)
+    _startup.setdefault("imports_seconds", imports_seconds)
+
+
+def startup_first_paint() -> Optional[Dict[str, float]]:
+    """
+    No fim do primeiro rerun completo do processo, grava no log (sempre, mesmo
+    com a instrumentação desativada: é uma linha por processo) o tempo de
+    importação e o tempo até a primeira página.
+    """
+    if "first_paint_seconds" in _startup or "script_started" not in _startup:
+        return None
+    _startup["first_paint_seconds"] = time.perf_counter() - _startup["script_started"]
+    metrics = {
+        "imports_seconds": _startup["imports_seconds"],
+        "first_paint_seconds": _startup["first_paint_seconds"],
+    }
+    logger.info(json.dumps({"label": "startup", **metrics}))
+    return metrics
+
+
+def startup_metrics() -> Dict[str, float]:
+    """Tempos de inicialização registrados (vazio antes da primeira página)."""
+    return {k: v for k, v in _startup.items() if k.endswith("_seconds")}
+
+
+def metrics_snapshot() -> Dict[str, Any]:
+    """Métricas acumuladas do processo (spans e consultas), para exportação."""
+    with _process_lock:
+        return {**json.loads(json.dumps(_process.as_dict())), "startup": startup_metrics()}
+
+
+def log_metrics_snapshot() -> None:
+    """Grava as métricas do processo como uma linha JSON no log (ex.: fim de um comando da CLI)."""
+    if ENABLED:
+        logger.info(json.dumps(metrics_snapshot(), ensure_ascii=False))
+
+
+def instrument_engine(engine) -> None:
+    """Registra os eventos do SQLAlchemy que contam consultas, linhas e latência."""
+    if not ENABLED:
+        return
+    from sqlalchemy import event
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def _before(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("instrumentation_start", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def _after(conn, cursor, statement, parameters, context, executemany):
+        start = conn.info["instrumentation_start"].pop()
+        # rowcount: linhas afetadas (DML); em SELECT muitos drivers retornam -1
+        _record_query(statement, time.perf_counter() - start, getattr(cursor, "rowcount", -1))
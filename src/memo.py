@@ -0,0 +1,101 @@
+"""
+Memoização das análises do 'analyzer.py', chaveada pela versão dos dados.
+
+Cada rerun do Streamlit (inclusive um clique em widget que não muda nada)
+chamaria de novo as análises sobre o mesmo DataFrame. Aqui o resultado fica
+guardado por (função, versão dos dados, parâmetros); enquanto a versão não
+muda, a análise não é refeita. A versão vem do TransactionCache (contagem,
+maior id e somas das linhas carregadas), então qualquer escrita gera chaves
+novas e as antigas saem pela política LRU.
+
+O memo é compartilhado entre sessões do mesmo processo: os resultados
+retornados devem ser tratados como somente leitura.
+"""
+import functools
+import inspect
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def freeze(value: Any) -> Hashable:
+    """Converte argumentos comuns (dict, list, set) em valores hasheáveis para a chave."""
+    if isinstance(value, dict):
+        return tuple(sorted((k, freeze(v)) for k, v in value.items()))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze(v) for v in value)
+    return value
+
+
+class AnalysisMemo:
+    """Cache LRU limitado, seguro entre threads, com contadores de acertos e falhas."""
+
+    def __init__(self, maxsize: int = 64):
+        self.maxsize = maxsize
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        """Retorna o valor guardado para `key` ou calcula, guarda e retorna."""
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+
+        # Calcula fora do lock: duas sessões podem, no pior caso, calcular a mesma chave
+        value = compute()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return value
+
+    def clear(self) -> None:
+        """Descarta todas as entradas (os contadores são mantidos)."""
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        """Contadores para diagnóstico: 'hits', 'misses', 'size' e 'maxsize'."""
+        with self._lock:
+            return {"hits": self.hits, "misses": self.misses, "size": len(self._entries), "maxsize": self.maxsize}
+
+    def memoize(self, normalize: Optional[Callable[[str, Any], Any]] = None) -> Callable:
+        """
+        Decorador para funções cujo primeiro argumento é o DataFrame de transações.
+
+        A função decorada ganha o argumento nomeado opcional `data_version`
+        (ex.: TransactionCache.get_versioned). Sem ele, a chamada é direta,
+        sem cache. O DataFrame não entra na chave: a versão o representa.
+
+        Args:
+            normalize: Função (nome do parâmetro, valor) -> valor usado na chave,
+                para parâmetros equivalentes gerarem a mesma chave (ex.: datas
+                do mesmo mês de referência).
+        """
+        def decorator(func: Callable) -> Callable:
+            signature = inspect.signature(func)
+
+            @functools.wraps(func)
+            def wrapper(*args, data_version: Optional[Hashable] = None, **kwargs):
+                if data_version is None:
+                    return func(*args, **kwargs)
+
+                bound = signature.bind(*args, **kwargs)
+                bound.apply_defaults()
+                params = list(bound.arguments.items())[1:]  # Sem o DataFrame
+                key = (func.__qualname__, data_version) + tuple(
+                    (name, freeze(normalize(name, value) if normalize else value)) for name, value in params
+                )
+                return self.get_or_compute(key, lambda: func(*args, **kwargs))
+
+            return wrapper
+
+        return decorator
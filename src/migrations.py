@@ -0,0 +1,246 @@
+"""
+Migrações de esquema para bancos criados antes das mudanças de índices.
+
+'models.Base.metadata.create_all' continua criando o esquema completo em
+instalações novas, mas não altera tabelas que já existem. As funções abaixo
+levam um banco existente ao esquema atual e verificam, via EXPLAIN, se as
+consultas por data e por categoria + data usam os índices.
+"""
+import os
+import threading
+from datetime import datetime
+from typing import Dict, List, Optional, Tuple
+
+import pandas as pd
+from sqlalchemy import Column, MetaData, String, Table, bindparam, inspect, select, text, update
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.orm import Session
+from sqlalchemy.schema import CreateColumn, DropIndex, Index
+
+from src import crud, database, models
+from src.models import Category, Transaction
+
+# Com 0, o app não verifica o esquema ao iniciar (rodar 'python -m src init' no deploy)
+SCHEMA_BOOTSTRAP = os.getenv("SCHEMA_BOOTSTRAP", "1").strip().lower() not in ("0", "false", "no")
+
+_schema_ready = False
+_schema_lock = threading.Lock()
+
+# Linhas lidas por vez ao preencher 'content_hash' em bancos existentes
+BACKFILL_BATCH_SIZE = 50000
+
+# Índices que existiam em versões anteriores e não são mais usados
+_OBSOLETE_INDEXES = {
+    "transactions": [("ix_transactions_description", "description")],
+}
+
+
+def upgrade_schema(engine: Engine) -> List[str]:
+    """
+    Cria as tabelas, colunas e índices que faltam e remove os índices obsoletos.
+
+    Colunas novas são adicionadas com ALTER TABLE; 'transactions.content_hash'
+    é preenchido antes de o índice único ser criado. Se a tabela agregada
+    'monthly_category_totals' acabou de ser criada, é preenchida a partir das
+    transações existentes, antes de qualquer escrita incremental nela.
+
+    Returns:
+        Lista com a descrição das alterações aplicadas (vazia se nada mudou).
+    """
+    actions: List[str] = []
+    existing_tables = set(inspect(engine).get_table_names())
+    models.Base.metadata.create_all(bind=engine)
+    inspector = inspect(engine)
+
+    with engine.begin() as conn:
+        for table in models.Base.metadata.sorted_tables:
+            columns = {col["name"] for col in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name not in columns:
+                    ddl = CreateColumn(column).compile(dialect=engine.dialect)
+                    table_name = engine.dialect.identifier_preparer.format_table(table)
+                    conn.execute(text(f"ALTER TABLE {table_name} ADD {ddl}"))
+                    actions.append(f"ADD COLUMN {table.name}.{column.name}")
+
+        filled = backfill_content_hashes(conn)
+        if filled:
+            actions.append(f"BACKFILL transactions.content_hash ({filled} linhas)")
+
+        for table in models.Base.metadata.sorted_tables:
+            existing = {ix["name"] for ix in inspector.get_indexes(table.name)}
+
+            for index in sorted(table.indexes, key=lambda ix: ix.name):
+                if index.name not in existing:
+                    index.create(conn)
+                    actions.append(f"CREATE INDEX {index.name}")
+
+            for name, column in _OBSOLETE_INDEXES.get(table.name, []):
+                if name in existing:
+                    # Tabela "solta" (fora do Base.metadata) só para gerar o DROP INDEX
+                    detached = Table(table.name, MetaData(), Column(column, String(255)))
+                    conn.execute(DropIndex(Index(name, detached.c[column])))
+                    actions.append(f"DROP INDEX {name}")
+
+    if models.MonthlyCategoryTotal.__tablename__ not in existing_tables:
+        with Session(bind=engine) as db:
+            rows = crud.rebuild_monthly_totals(db)
+        if rows:
+            actions.append(f"REBUILD monthly_category_totals ({rows} linhas)")
+
+    return actions
+
+
+def missing_schema(engine: Engine) -> List[str]:
+    """
+    Tabelas e colunas do modelo ausentes no banco, só lendo o catálogo (sem
+    DDL). Usado por comandos somente leitura, que não aplicam migrações.
+    """
+    inspector = inspect(engine)
+    tables = set(inspector.get_table_names())
+    missing: List[str] = []
+    for table in models.Base.metadata.sorted_tables:
+        if table.name not in tables:
+            missing.append(table.name)
+            continue
+        columns = {col["name"] for col in inspector.get_columns(table.name)}
+        missing.extend(f"{table.name}.{column.name}" for column in table.columns if column.name not in columns)
+    return missing
+
+
+def ensure_schema(engine: Optional[Engine] = None) -> List[str]:
+    """
+    Executa upgrade_schema uma única vez por processo (as chamadas seguintes
+    não vão ao banco). Usado na inicialização do app e da CLI.
+
+    Returns:
+        Alterações aplicadas na primeira chamada (vazia nas demais).
+    """
+    global _schema_ready
+    if _schema_ready:
+        return []
+    with _schema_lock:
+        if _schema_ready:
+            return []
+        actions = upgrade_schema(engine or database.get_engine())
+        _schema_ready = True
+        return actions
+
+
+def backfill_content_hashes(conn: Connection) -> int:
+    """
+    Calcula 'content_hash' das transações gravadas antes da deduplicação.
+
+    As linhas são lidas em ordem de id, em lotes; a contagem de ocorrências
+    passa de um lote para o outro, então duplicatas legítimas já existentes
+    recebem hashes distintos e continuam no banco.
+
+    Returns:
+        Número de linhas preenchidas.
+    """
+    occurrences: Dict[str, int] = {}
+    last_id, filled = 0, 0
+    table = Transaction.__table__
+    stmt = update(table).where(table.c.id == bindparam("row_id")).values(content_hash=bindparam("hash"))
+
+    while True:
+        batch = pd.read_sql(
+            select(
+                Transaction.id, Transaction.date, Transaction.amount,
+                Transaction.description, Category.name.label("category_name"),
+            )
+            .join(Category, Transaction.category_id == Category.id)
+            .where(Transaction.content_hash.is_(None), Transaction.id > last_id)
+            .order_by(Transaction.id)
+            .limit(BACKFILL_BATCH_SIZE),
+            conn,
+            parse_dates=["date"],
+        )
+        if batch.empty:
+            return filled
+
+        hashed = crud.add_content_hashes(batch, occurrences)
+        params = [
+            {"row_id": row_id, "hash": content_hash}
+            for row_id, content_hash in zip(hashed["id"].tolist(), hashed["content_hash"].tolist())
+        ]
+        for start in range(0, len(params), crud.BULK_INSERT_CHUNK_SIZE):
+            conn.execute(stmt, params[start:start + crud.BULK_INSERT_CHUNK_SIZE])
+
+        filled += len(batch)
+        last_id = int(batch["id"].iloc[-1])
+
+
+# Dialetos em que explain_index_usage sabe ler o plano de execução
+EXPLAIN_DIALECTS = ("sqlite", "postgresql")
+
+
+def _access_path_queries() -> Dict[str, Tuple[object, str]]:
+    """
+    Consultas representativas dos filtros do analyzer (janela de datas e
+    categoria + data), cada uma com o índice que deve atendê-la.
+    """
+    start, end = datetime(2024, 1, 1), datetime(2024, 4, 1)
+    return {
+        "date_range": (
+            select(Transaction.date, Transaction.amount, Transaction.category_id).where(
+                Transaction.date >= start, Transaction.date < end
+            ),
+            "ix_transactions_date",
+        ),
+        "category_date": (
+            select(Transaction.date, Transaction.amount).where(
+                Transaction.category_id == 1, Transaction.date >= start, Transaction.date < end
+            ),
+            "ix_transactions_category_date",
+        ),
+    }
+
+
+def explain_index_usage(engine: Engine) -> Dict[str, Dict[str, object]]:
+    """
+    Roda EXPLAIN nas consultas por data e por categoria + data.
+
+    Suporta SQLite (EXPLAIN QUERY PLAN) e PostgreSQL (EXPLAIN). No PostgreSQL
+    o seq scan é desabilitado durante a verificação, para que tabelas pequenas
+    (ex.: banco de teste) ainda mostrem se o índice é utilizável.
+
+    Returns:
+        Para cada consulta: {'plan': texto do plano, 'index': índice esperado,
+        'uses_index': bool}. 'uses_index' só é verdadeiro se o plano usa o
+        índice esperado (pelo nome), não qualquer índice.
+
+    Raises:
+        ValueError: Dialeto fora de EXPLAIN_DIALECTS (ex.: SQL Server).
+    """
+    dialect = engine.dialect.name
+    if dialect not in EXPLAIN_DIALECTS:
+        raise ValueError(f"Verificação via EXPLAIN não suportada para o dialeto '{dialect}'.")
+
+    results: Dict[str, Dict[str, object]] = {}
+    with engine.begin() as conn:
+        if dialect == "postgresql":
+            conn.execute(text("SET LOCAL enable_seqscan = off"))
+        else:
+            # Lê o catálogo para que a conexão (do pool) recarregue o esquema:
+            # EXPLAIN QUERY PLAN não detecta índices criados por outra conexão
+            conn.execute(text("SELECT count(*) FROM sqlite_master")).scalar()
+
+        for name, (stmt, index_name) in _access_path_queries().items():
+            sql = str(stmt.compile(dialect=engine.dialect, compile_kwargs={"literal_binds": True}))
+            if dialect == "sqlite":
+                rows = conn.execute(text(f"EXPLAIN QUERY PLAN {sql}")).fetchall()
+                plan = "\n".join(str(row[-1]) for row in rows)
+                uses_index = any(
+                    f"{usage} {index_name}" in plan for usage in ("USING INDEX", "USING COVERING INDEX")
+                )
+            else:
+                rows = conn.execute(text(f"EXPLAIN {sql}")).fetchall()
+                plan = "\n".join(str(row[0]) for row in rows)
+                # 'Index Scan using ix_...', 'Index Only Scan using ix_...' ou 'Bitmap Index Scan on ix_...'
+                uses_index = (
+                    any(f"{usage} {index_name}" in plan for usage in ("using", "on"))
+                    and "Seq Scan" not in plan
+                )
+            results[name] = {"plan": plan, "index": index_name, "uses_index": uses_index}
+
+    return results
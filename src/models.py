@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, Float, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.ext.declarative import declarative_base
 from pydantic import BaseModel
@@ -27,12 +27,83 @@ class Transaction(Base):
     date = Column(DateTime, default=datetime.utcnow, nullable=False)
     amount = Column(Float, nullable=False)
     # CORREÇÃO: String(255) aqui também
-    description = Column(String(255), index=True)
+    # Sem índice: nenhuma consulta filtra pela descrição
+    description = Column(String(255))
     
     category_id = Column(Integer, ForeignKey("categories.id"), nullable=False)
+    # Hash do conteúdo normalizado (ver crud.add_content_hashes): reimportar um
+    # extrato com períodos sobrepostos não duplica as transações já gravadas
+    content_hash = Column(String(64))
     
     category = relationship("Category", back_populates="transactions")
 
+    # Índices dos caminhos de acesso do analyzer (janelas de data e categoria + data).
+    # INCLUDE torna os índices "cobrindo" as colunas lidas no SQL Server e PostgreSQL.
+    # Bancos já existentes recebem estes índices via migrations.upgrade_schema.
+    __table_args__ = (
+        Index(
+            'ix_transactions_date', 'date',
+            mssql_include=['amount', 'category_id'],
+            postgresql_include=['amount', 'category_id'],
+        ),
+        Index(
+            'ix_transactions_category_date', 'category_id', 'date',
+            mssql_include=['amount'],
+            postgresql_include=['amount'],
+        ),
+        # O SQL Server aceita um único NULL em índice UNIQUE: o filtro libera
+        # as linhas antigas ainda sem hash (até o backfill da migração)
+        Index(
+            'ux_transactions_content_hash', 'content_hash',
+            unique=True,
+            mssql_where=content_hash.isnot(None),
+        ),
+    )
+
+class MonthlyCategoryTotal(Base):
+    """
+    Tabela agregada de totais mensais por categoria.
+    Mantida incrementalmente pelo 'crud' a cada escrita, para que o dashboard
+    leia O(meses x categorias) linhas em vez do histórico completo.
+    """
+    __tablename__ = "monthly_category_totals"
+    year = Column(Integer, primary_key=True)
+    month = Column(Integer, primary_key=True)
+    category_id = Column(Integer, ForeignKey("categories.id"), primary_key=True)
+    # Entradas (amount > 0) e Saídas (valor absoluto de amount < 0)
+    income = Column(Float, nullable=False, default=0)
+    expense = Column(Float, nullable=False, default=0)
+    income_count = Column(Integer, nullable=False, default=0)
+    expense_count = Column(Integer, nullable=False, default=0)
+
+class ImportJob(Base):
+    """
+    Jobs de importação de CSV executados em segundo plano.
+    Cada bloco (chunk) do arquivo é gravado junto com o checkpoint
+    'chunks_done', permitindo retomar a importação de onde parou.
+    """
+    __tablename__ = "import_jobs"
+    id = Column(Integer, primary_key=True, index=True)
+    filename = Column(String(255), nullable=False)
+    file_path = Column(String(1024), nullable=False)
+    # pending -> running -> done | failed
+    status = Column(String(20), nullable=False, default="pending", index=True)
+    chunk_size = Column(Integer, nullable=False)
+    chunks_done = Column(Integer, nullable=False, default=0)
+    rows_done = Column(Integer, nullable=False, default=0)
+    total_rows = Column(Integer)
+    new_categories = Column(Integer, nullable=False, default=0)
+    # Linhas ignoradas por já existirem no banco (reimportação)
+    rows_skipped = Column(Integer, nullable=False, default=0, server_default="0")
+    error = Column(String(1024))
+    created_at = Column(DateTime, default=datetime.utcnow, nullable=False)
+    # Início da execução atual e linhas já gravadas nesse momento (para linhas/s)
+    started_at = Column(DateTime)
+    start_rows = Column(Integer, nullable=False, default=0)
+    # Batimento do worker: jobs 'running' sem atualização recente são retomáveis
+    updated_at = Column(DateTime)
+    finished_at = Column(DateTime)
+
 # =======================================================
 # 2. Schemas da API (Pydantic)
 # =======================================================
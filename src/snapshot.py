@@ -0,0 +1,122 @@
+"""
+Snapshot colunar (Arrow IPC) do DataFrame de transações em disco local.
+
+Evita reconstruir o DataFrame inteiro a partir do banco a cada reinício do
+container ou novo processo do Streamlit. O arquivo é mapeado em memória
+(memory map) na leitura e guarda, nos metadados, a versão (marca d'água) das
+linhas que contém; o cache só precisa buscar no banco o delta acima dela.
+
+A escrita é atômica (arquivo temporário + os.replace), então vários processos
+no mesmo host podem ler e atualizar o mesmo snapshot com segurança.
+"""
+import hashlib
+import importlib.util
+import json
+import os
+import tempfile
+from typing import Any, Dict, Optional, Tuple
+
+import pandas as pd
+
+# pyarrow é opcional (sem ele o snapshot fica desativado) e só é importado no
+# primeiro uso, para não pesar na inicialização do app
+HAS_PYARROW = importlib.util.find_spec("pyarrow") is not None
+
+
+def _pyarrow():
+    import pyarrow
+    import pyarrow.ipc  # noqa: F401 (submódulo usado via pyarrow.ipc)
+    return pyarrow
+
+
+# Caminho do snapshot. Defina TRANSACTIONS_SNAPSHOT_PATH vazio para desativar.
+SNAPSHOT_PATH = os.getenv(
+    "TRANSACTIONS_SNAPSHOT_PATH",
+    os.path.join(tempfile.gettempdir(), "financas_transactions.arrow"),
+)
+
+# Incrementar quando as colunas/tipos do DataFrame ou os campos da versão mudarem
+# (invalida snapshots antigos)
+SNAPSHOT_FORMAT_VERSION = 3
+
+_METADATA_KEY = b"financas_snapshot"
+
+
+def is_enabled(path: Optional[str] = None) -> bool:
+    """Indica se o snapshot pode ser usado (pyarrow instalado e caminho definido)."""
+    return HAS_PYARROW and bool(path or SNAPSHOT_PATH)
+
+
+def source_key(url: Any) -> str:
+    """Identifica o banco de origem sem guardar a URL (nem a senha) no arquivo."""
+    return hashlib.sha256(str(url).encode("utf-8")).hexdigest()
+
+
+def save_snapshot(df: pd.DataFrame, version: Dict[str, Any], source: str, path: Optional[str] = None) -> bool:
+    """
+    Grava o DataFrame como arquivo Arrow IPC, junto com sua versão.
+
+    Args:
+        df: DataFrame de transações (como retornado pelo cache).
+        version: Versão das linhas contidas (ver crud.get_transactions_version).
+        source: Identificador do banco de origem (ver source_key).
+        path: Caminho do arquivo (padrão: SNAPSHOT_PATH).
+
+    Returns:
+        True se o snapshot foi gravado.
+    """
+    path = path or SNAPSHOT_PATH
+    if not is_enabled(path):
+        return False
+
+    metadata = {
+        "format": SNAPSHOT_FORMAT_VERSION,
+        "source": source,
+        "version": version,
+    }
+    pa = _pyarrow()
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    table = table.replace_schema_metadata({
+        **(table.schema.metadata or {}),
+        _METADATA_KEY: json.dumps(metadata).encode("utf-8"),
+    })
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+        os.replace(tmp_path, path)  # Troca atômica: leitores nunca veem arquivo parcial
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    return True
+
+
+def load_snapshot(source: str, path: Optional[str] = None) -> Optional[Tuple[pd.DataFrame, Dict[str, Any]]]:
+    """
+    Lê o snapshot via memory map.
+
+    Returns:
+        Tupla (DataFrame, versão) ou None se não houver snapshot válido para este banco.
+    """
+    path = path or SNAPSHOT_PATH
+    if not is_enabled(path) or not os.path.exists(path):
+        return None
+
+    pa = _pyarrow()
+    try:
+        with pa.memory_map(path, "r") as source_file:
+            table = pa.ipc.open_file(source_file).read_all()
+        metadata = json.loads((table.schema.metadata or {}).get(_METADATA_KEY, b"{}"))
+    except (OSError, ValueError, pa.ArrowInvalid):
+        return None  # Arquivo corrompido ou de outro formato: o cache recarrega do banco
+
+    if metadata.get("format") != SNAPSHOT_FORMAT_VERSION or metadata.get("source") != source:
+        return None
+
+    # split_blocks evita consolidar colunas numéricas em um bloco (menos cópias)
+    return table.to_pandas(split_blocks=True), metadata["version"]